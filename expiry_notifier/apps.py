@@ -7,3 +7,8 @@ logger = logging.getLogger(__name__)
 class ExpiryNotifierConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'expiry_notifier'
+
+    def ready(self):
+        # Fail at startup on a broken config.json instead of in the middle of a notification run
+        from expiry_notifier.services.config_service import get_notification_config
+        get_notification_config()
@@ -0,0 +1,104 @@
+import os
+import random
+from contextlib import ExitStack, contextmanager
+from datetime import datetime, timedelta, timezone
+from unittest import mock
+from ldap3 import ASYNC, MOCK_ASYNC, MOCK_SYNC, OFFLINE_AD_2012_R2, SYNC, Connection, Server
+from expiry_notifier.ldap import ldap_connector
+from expiry_notifier.ldap.ldap_connector import LDAPConnectionPool, get_operation_count
+from expiry_notifier.utils.time_util import NEVER_EXPIRES, datetime_to_filetime
+
+BIND_PASSWORD = 'benchmark'
+
+UAC_NORMAL = 512
+UAC_DISABLED = 514
+UAC_DONT_EXPIRE_PASSWORD = 66048
+
+# The mock strategy cannot evaluate the LDAP_MATCHING_RULE_BIT_AND extensible match,
+# so disabled accounts are excluded by the exact userAccountControl value the generator uses
+MOCK_DIRECTORY_FILTER = f'(&(objectCategory=person)(objectClass=user)(!(userAccountControl={UAC_DISABLED})))'
+
+
+class FakeDirectory:
+    def __init__(self, size, base_dn, admin_group_dn, seed=0):
+        self.size = size
+        self.base_dn = base_dn
+        self.admin_group_dn = admin_group_dn
+        self.bind_dn = f'CN=benchmark,CN=Users,{base_dn}'
+        self.server = Server(f'fake-directory-{size}', get_info=OFFLINE_AD_2012_R2)
+        self.connections = []
+        self.populate(seed)
+
+    def populate(self, seed):
+        rnd = random.Random(seed)
+        now = datetime.now(timezone.utc)
+        staff_group_dn = f'CN=Staff,CN=Users,{self.base_dn}'
+
+        seeder = Connection(self.server, user=self.bind_dn, password=BIND_PASSWORD, client_strategy=MOCK_SYNC)
+        seeder.strategy.add_entry(self.bind_dn, {'userPassword': BIND_PASSWORD, 'sn': 'benchmark'})
+
+        for i in range(self.size):
+            roll = rnd.random()
+            if roll < 0.5:
+                # Most accounts never expire; AD stores that as either 0 or the int64 max sentinel
+                expires = rnd.choice((0, NEVER_EXPIRES))
+            elif roll < 0.6:
+                expires = datetime_to_filetime(now - timedelta(days=rnd.uniform(2, 365)))
+            else:
+                expires = datetime_to_filetime(now + timedelta(days=rnd.uniform(-2, 400)))
+
+            roll = rnd.random()
+            uac = UAC_NORMAL if roll < 0.92 else UAC_DISABLED if roll < 0.97 else UAC_DONT_EXPIRE_PASSWORD
+
+            first_name, last_name = f'User{i}', f'Bench{i}'
+            attributes = {
+                'objectClass': ['top', 'person', 'organizationalPerson', 'user'],
+                'objectCategory': 'person',
+                'cn': f'{first_name} {last_name}',
+                'sAMAccountName': f'bench{i}',
+                'givenName': first_name,
+                'sn': last_name,
+                'accountExpires': str(expires),
+                'userAccountControl': str(uac),
+                'memberOf': [self.admin_group_dn if i % 200 == 0 else staff_group_dn],
+                'objectGUID': f'{{{i:08x}-0000-4000-8000-{seed:012x}}}',
+                'uSNChanged': str(i + 1),
+            }
+            if rnd.random() < 0.98:
+                attributes['mail'] = f'bench{i}@example.com'
+            if rnd.random() < 0.05:
+                attributes['info'] = rnd.choice(('notified_early', 'notified_early;notified_middle'))
+
+            seeder.strategy.add_entry(f'CN={first_name} {last_name},CN=Users,{self.base_dn}', attributes)
+
+    def connect(self, client_strategy=SYNC, pinned=False):
+        conn = Connection(
+            self.server,
+            user=self.bind_dn,
+            password=BIND_PASSWORD,
+            client_strategy=MOCK_ASYNC if client_strategy == ASYNC else MOCK_SYNC,
+            raise_exceptions=True,
+            collect_usage=True,
+        )
+        conn.bind()
+        self.connections.append(conn)
+        return conn
+
+    @property
+    def operations(self):
+        return sum(get_operation_count(conn) for conn in self.connections)
+
+    @contextmanager
+    def installed(self):
+        # Route every LDAP connection the application opens to this in-memory directory
+        pool = LDAPConnectionPool(self.connect, max_size=4, max_idle=300, healthcheck_interval=60, acquire_timeout=10)
+        with ExitStack() as stack:
+            stack.enter_context(mock.patch.object(ldap_connector, 'get_connection_pool', lambda pinned=False: pool))
+            stack.enter_context(mock.patch.object(ldap_connector, 'get_ldap_connection', self.connect))
+            stack.enter_context(mock.patch('expiry_notifier.utils.ldap_utils.get_ldap_connection', self.connect))
+            stack.enter_context(mock.patch(
+                'expiry_notifier.services.ldap_service.get_directory_filter', lambda: MOCK_DIRECTORY_FILTER
+            ))
+            stack.enter_context(mock.patch.dict(os.environ, {'AUTH_LDAP_BASE_DN': self.base_dn}))
+            yield self
+            pool.clear()
@@ -0,0 +1,156 @@
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from django.contrib.auth.models import User
+from django.contrib.messages.storage.fallback import FallbackStorage
+from django.core import mail
+from django.core.cache import cache
+from django.test import RequestFactory
+from django.test.utils import override_settings, setup_databases, teardown_databases
+from expiry_notifier.benchmarks.fake_directory import FakeDirectory
+from expiry_notifier.services import expiry_classifier
+from expiry_notifier.services.ldap_service import ldap_directory_snapshot
+from expiry_notifier.services.notification_service import load_notification_snapshot, process_expiry, send_notification
+from expiry_notifier.views.email_views import send_email_view
+from expiry_notifier.views.main_views import main_page
+
+DEFAULT_SIZES = (1_000, 10_000, 100_000)
+BASE_DN = 'DC=benchmark,DC=local'
+ADMIN_GROUP_DN = f'CN=Domain Admins,CN=Users,{BASE_DN}'
+
+BENCHMARK_SETTINGS = {
+    'AUTH_LDAP_BASE_DN': BASE_DN,
+    'LDAP_ADMIN_GROUP_DN': ADMIN_GROUP_DN,
+    'DIRECTORY_SOURCE': 'ldap',
+    'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+    'EMAIL_MAX_PER_SECOND': 0,
+    'CACHES': {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'benchmark'}},
+}
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, timeout=5
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def build_request(method='get', path='/', **params):
+    request = getattr(RequestFactory(), method)(path, params)
+    request.user = User(username='benchmark')
+    request.session = {}
+    request._messages = FallbackStorage(request)
+    return request
+
+
+def measure(directory, scenario, func, trace_memory=True) -> dict:
+    mail.outbox = []
+    operations_before = directory.operations
+    if trace_memory:
+        tracemalloc.start()
+        tracemalloc.reset_peak()
+        memory_before = tracemalloc.get_traced_memory()[0]
+
+    started = time.perf_counter()
+    result = func()
+    wall_seconds = time.perf_counter() - started
+
+    peak_memory_kb = None
+    if trace_memory:
+        peak_memory_kb = round((tracemalloc.get_traced_memory()[1] - memory_before) / 1024)
+        tracemalloc.stop()
+
+    return {
+        'size': directory.size,
+        'scenario': scenario,
+        'wall_seconds': round(wall_seconds, 4),
+        'ldap_operations': directory.operations - operations_before,
+        'emails_sent': len(mail.outbox),
+        'peak_memory_kb': peak_memory_kb,
+        'items': result,
+    }
+
+
+def run_scenarios(directory, trace_memory=True) -> list[dict]:
+    results = []
+    state = {}
+
+    def ldap_users():
+        state['snapshot'] = ldap_directory_snapshot()
+        return len(state['snapshot'].users)
+
+    def plan_run():
+        # Decision phase only: a dry run writes nothing, so send_notification below still has work to do
+        return len(process_expiry(load_notification_snapshot(), dry_run=True))
+
+    def notification_run():
+        return len(send_notification())
+
+    def render_dashboard():
+        response = main_page(build_request())
+        return len(response.content)
+
+    def manual_send():
+        now = datetime.now(timezone.utc)
+        user = next(
+            (user for user in state['snapshot'].expiry_index
+             if user.email and not user.is_admin and user.expires_at < now),
+            None,
+        )
+        if user is None:
+            return 0
+        send_email_view(build_request('post', f'/send-email/{user.email}/'), user.email)
+        return 1
+
+    scenarios = [
+        ('ldap_users', ldap_users),
+        ('process_expiry', plan_run),
+        ('send_notification', notification_run),
+        ('main_page', lambda: cache.clear() or render_dashboard()),
+        ('main_page_cached', render_dashboard),
+        ('send_email_view', manual_send),
+    ]
+    for name, func in scenarios:
+        results.append(measure(directory, name, func, trace_memory=trace_memory))
+    return results
+
+
+def run_sizes(report, sizes, seed, trace_memory):
+    for size in sizes:
+        started = time.perf_counter()
+        directory = FakeDirectory(size, BASE_DN, ADMIN_GROUP_DN, seed=seed)
+        populate_seconds = time.perf_counter() - started
+
+        cache.clear()
+        with directory.installed():
+            for result in run_scenarios(directory, trace_memory=trace_memory):
+                result['populate_seconds'] = round(populate_seconds, 2)
+                report['results'].append(result)
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, seed=0, trace_memory=True) -> dict:
+    report = {
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'git_revision': git_revision(),
+        'python': platform.python_version(),
+        'numpy': expiry_classifier.np is not None,
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'tracemalloc': trace_memory,
+        'results': [],
+    }
+
+    # send_notification resumes stale runs and journals new ones, so it must never see the
+    # real database: a pending run there would be "delivered" into locmem and marked sent
+    old_databases = setup_databases(verbosity=0, interactive=False)
+    try:
+        with override_settings(**BENCHMARK_SETTINGS):
+            run_sizes(report, sizes, seed, trace_memory)
+    finally:
+        teardown_databases(old_databases, verbosity=0)
+    return report
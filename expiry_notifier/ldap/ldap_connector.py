@@ -1,43 +1,241 @@
+from collections import deque
+from contextlib import contextmanager
+from functools import partial
 from django.conf import settings
-from ldap3 import Server, Connection, Tls, ALL, core
+from ldap3 import Server, ServerPool, Connection, Tls, NONE, DSA, SCHEMA, ALL, SYNC, FIRST, ROUND_ROBIN, RANDOM, core
+import os
 import ssl
+import threading
+import time
 import logging
+from ldap3.utils.config import set_config_parameter
+from expiry_notifier.metrics import track_ldap
 
 logger = logging.getLogger(__name__)
 
+GET_INFO_MODES = {'NONE': NONE, 'DSA': DSA, 'SCHEMA': SCHEMA, 'ALL': ALL}
+POOL_STRATEGIES = {'ROUND_ROBIN': ROUND_ROBIN, 'FIRST': FIRST, 'RANDOM': RANDOM}
 
-def get_ldap_connection():
+_server_pools = {}
+_server_lock = threading.Lock()
+_pools = {}
+_pool_lock = threading.Lock()
+
+
+def get_ldap_servers() -> list[str]:
+    return getattr(settings, 'LDAP_SERVERS', None) or [settings.LDAP_SERVER]
+
+
+def build_server(uri, connect_timeout):
     tls_config = Tls(
         validate=ssl.CERT_NONE,
         version=ssl.PROTOCOL_TLSv1_2,
         ca_certs_file=getattr(settings, 'LDAP_CA_CERT_FILE', None),
         valid_names=[settings.LDAP_SERVER_HOSTNAME] if hasattr(settings, 'LDAP_SERVER_HOSTNAME') else None
     )
+    get_info = getattr(settings, 'LDAP_SERVER_GET_INFO', 'SCHEMA')
+    return Server(
+        uri,
+        use_ssl=True,
+        tls=tls_config,
+        get_info=GET_INFO_MODES.get(str(get_info).upper(), SCHEMA),
+        connect_timeout=connect_timeout
+    )
 
+
+def get_ldap_server(pinned=False):
+    # Reads are spread over all DCs with LDAP_POOL_STRATEGY; writes (and reads that feed them)
+    # always go to the first reachable DC in LDAP_SERVERS order, so they see their own changes
+    role = 'write' if pinned else 'read'
+    with _server_lock:
+        if role not in _server_pools:
+            uris = get_ldap_servers()
+            # With a fallback available, a dead DC should cost seconds rather than the full timeout
+            connect_timeout = getattr(settings, 'LDAP_CONNECTION_TIMEOUT', 10)
+            if len(uris) > 1:
+                connect_timeout = getattr(settings, 'LDAP_FAILOVER_TIMEOUT', 3)
+            # ldap3 sleeps this long after a failed cycle even when no further cycle follows
+            set_config_parameter('POOLING_LOOP_TIMEOUT', 0)
+            strategy = 'FIRST' if pinned else str(getattr(settings, 'LDAP_POOL_STRATEGY', 'ROUND_ROBIN')).upper()
+            _server_pools[role] = ServerPool(
+                [build_server(uri, connect_timeout) for uri in uris],
+                pool_strategy=POOL_STRATEGIES.get(strategy, ROUND_ROBIN),
+                # Try every server once per open, and skip one that failed for LDAP_SERVER_EXHAUST seconds
+                active=1,
+                exhaust=getattr(settings, 'LDAP_SERVER_EXHAUST', 60),
+            )
+        return _server_pools[role]
+
+
+def get_ldap_connection(client_strategy=SYNC, pinned=False):
+    conn = Connection(
+        get_ldap_server(pinned),
+        client_strategy=client_strategy,
+        user=settings.AUTH_LDAP_BIND_DN,
+        password=settings.AUTH_LDAP_BIND_PASSWORD,
+        raise_exceptions=True,
+        collect_usage=True,
+        receive_timeout=getattr(settings, 'LDAP_RECEIVE_TIMEOUT', 30)
+    )
     try:
-        server = Server(
-            settings.LDAP_SERVER,
-            use_ssl=True,
-            tls=tls_config,
-            get_info=ALL,
-            connect_timeout=getattr(settings, 'LDAP_CONNECTION_TIMEOUT', 10)
-        )
-
-        conn = Connection(
-            server,
-            user=settings.AUTH_LDAP_BIND_DN,
-            password=settings.AUTH_LDAP_BIND_PASSWORD,
-            auto_bind=True,
-            raise_exceptions=True,
-            receive_timeout=getattr(settings, 'LDAP_RECEIVE_TIMEOUT', 30)
-        )
-
-        logger.info(f"Successfully connected to LDAP server: {settings.LDAP_SERVER}")
+        conn.open(read_server_info=False)
+        # Schema/DSA info is read on the first bind only and then kept on the shared Server
+        server = conn.server
+        with track_ldap('bind'):
+            conn.bind(read_server_info=server.get_info != NONE and server.schema is None and server.info is None)
+
+        logger.info(f"Successfully connected to LDAP server: {server.name}")
         return conn
 
     except core.exceptions.LDAPSocketOpenError as e:
+        close_connection(conn)
         logger.error(f"Connection to LDAP server failed (network error): {e}")
         raise core.exceptions.LDAPException(
             f"Could not establish connection to LDAP server: {str(e)}. "
             "Check server availability and network connectivity."
         ) from e
+    except BaseException:
+        close_connection(conn)
+        raise
+
+
+def close_connection(conn):
+    try:
+        conn.unbind()
+    except Exception as e:
+        logger.debug(f"Error while closing LDAP connection: {e}")
+    finally:
+        # ldap3 registers every connection in its ServerPool and never forgets it; the pools
+        # here live for the whole process, so without this each closed connection (and its
+        # last response) would stay reachable forever
+        if conn.server_pool is not None:
+            conn.server_pool.pool_states.pop(conn, None)
+
+
+def get_operation_count(conn):
+    return conn.usage.operations if conn.usage else 0
+
+
+class LDAPConnectionPool:
+    def __init__(self, factory, max_size, max_idle, healthcheck_interval, acquire_timeout):
+        self.factory = factory
+        self.max_size = max_size
+        self.max_idle = max_idle
+        self.healthcheck_interval = healthcheck_interval
+        self.acquire_timeout = acquire_timeout
+        self.pid = os.getpid()
+        self._idle = deque()
+        self._in_use = 0
+        self._cond = threading.Condition()
+
+    def acquire(self):
+        deadline = time.monotonic() + self.acquire_timeout
+        with self._cond:
+            while True:
+                self._evict_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._in_use < self.max_size:
+                    conn, released_at = None, None
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise core.exceptions.LDAPException(
+                        f"LDAP connection pool exhausted ({self.max_size} connections in use)"
+                    )
+                self._cond.wait(remaining)
+
+        try:
+            if conn is None:
+                return self.factory()
+            return self._checked(conn, released_at)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard=False):
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or not conn.bound or os.getpid() != self.pid:
+                self._close(conn)
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def clear(self):
+        with self._cond:
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._close(conn)
+
+    def _checked(self, conn, released_at):
+        if not conn.closed and conn.bound:
+            if time.monotonic() - released_at < self.healthcheck_interval:
+                return conn
+            try:
+                conn.extend.standard.who_am_i()
+                return conn
+            except core.exceptions.LDAPException as e:
+                logger.warning(f"Pooled LDAP connection failed health check, rebinding: {e}")
+
+        self._close(conn)
+        return self.factory()
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        # Oldest connections sit at the left end of the deque
+        while self._idle and now - self._idle[0][1] > self.max_idle:
+            conn, _ = self._idle.popleft()
+            self._close(conn)
+
+    @staticmethod
+    def _close(conn):
+        close_connection(conn)
+
+
+def get_connection_pool(pinned=False):
+    role = 'write' if pinned else 'read'
+    with _pool_lock:
+        pool = _pools.get(role)
+        if pool is None or pool.pid != os.getpid():
+            pool = _pools[role] = LDAPConnectionPool(
+                partial(get_ldap_connection, pinned=pinned),
+                max_size=getattr(settings, 'LDAP_POOL_SIZE', 4),
+                max_idle=getattr(settings, 'LDAP_POOL_MAX_IDLE', 300),
+                healthcheck_interval=getattr(settings, 'LDAP_POOL_HEALTHCHECK_INTERVAL', 60),
+                acquire_timeout=getattr(settings, 'LDAP_CONNECTION_TIMEOUT', 10),
+            )
+        return pool
+
+
+@contextmanager
+def ldap_connection(pinned=False):
+    pool = get_connection_pool(pinned)
+    conn = pool.acquire()
+    try:
+        yield conn
+    except core.exceptions.LDAPCommunicationError:
+        pool.release(conn, discard=True)
+        raise
+    except BaseException:
+        pool.release(conn)
+        raise
+    else:
+        pool.release(conn)
+
+
+def _reset_after_fork():
+    # Sockets inherited from the parent (gunicorn --preload) must not be reused or
+    # unbound in the child; drop the pool and let the child open its own connections.
+    global _pools, _pool_lock, _server_lock
+    _pools = {}
+    _pool_lock = threading.Lock()
+    _server_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
@@ -0,0 +1,77 @@
+from datetime import datetime
+from ldap3.utils.conv import escape_filter_chars
+from expiry_notifier.utils.time_util import NEVER_EXPIRES, datetime_to_filetime
+
+MATCHING_RULE_BIT_AND = '1.2.840.113556.1.4.803'
+MATCHING_RULE_IN_CHAIN = '1.2.840.113556.1.4.1941'
+ACCOUNTDISABLE = 0x0002
+
+
+def split_clauses(clause, operator) -> list[str]:
+    # "(&(a)(b))" -> ["(a)", "(b)"] when `operator` matches; values are escaped, so every
+    # parenthesis is structural
+    if not clause.startswith(f'({operator}('):
+        return [clause]
+    parts, depth, start = [], 0, 2
+    for index in range(2, len(clause) - 1):
+        depth += {'(': 1, ')': -1}.get(clause[index], 0)
+        if depth == 0:
+            parts.append(clause[start:index + 1])
+            start = index + 1
+    return parts
+
+
+def combine(operator, clauses) -> str:
+    parts = [part for clause in clauses if clause for part in split_clauses(clause, operator)]
+    if len(parts) == 1:
+        return parts[0]
+    return f'({operator}{"".join(parts)})'
+
+
+def and_(*clauses) -> str:
+    return combine('&', clauses)
+
+
+def or_(*clauses) -> str:
+    return combine('|', clauses)
+
+
+def not_(clause) -> str:
+    return f'(!{clause})'
+
+
+def present(attribute) -> str:
+    return f'({attribute}=*)'
+
+
+def equals(attribute, value) -> str:
+    return f'({attribute}={escape_filter_chars(str(value))})'
+
+
+def person_users() -> str:
+    return '(&(objectCategory=person)(objectClass=user))'
+
+
+def enabled_users() -> str:
+    return and_(person_users(), not_(f'(userAccountControl:{MATCHING_RULE_BIT_AND}:={ACCOUNTDISABLE})'))
+
+
+def member_of(group_dn, nested=False) -> str:
+    # LDAP_MATCHING_RULE_IN_CHAIN also follows nested groups, at a noticeably higher cost on the DC
+    attribute = f'memberOf:{MATCHING_RULE_IN_CHAIN}:' if nested else 'memberOf'
+    return f'({attribute}={escape_filter_chars(group_dn)})'
+
+
+def never_expires() -> str:
+    # Both encodings AD uses for "no expiry date"
+    return or_(equals('accountExpires', 0), equals('accountExpires', NEVER_EXPIRES))
+
+
+def expires_between(start: datetime | None = None, end: datetime | None = None) -> str:
+    # accountExpires in [start, end). Both "never expires" encodings (0 and the int64 max) fall outside.
+    # ldap3 validates the value against the AD timestamp syntax, so an open end excludes the max
+    # sentinel by equality rather than with a bound that is not a representable date
+    lower = f'(accountExpires>={datetime_to_filetime(start) if start else 1})'
+    if end:
+        return and_(lower, f'(accountExpires<={datetime_to_filetime(end) - 1})')
+    return and_(lower, not_(equals('accountExpires', NEVER_EXPIRES)))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from expiry_notifier.ldap.query_builder import present
+from expiry_notifier.services.ldap_service import get_users_filter, ldap_directory_snapshot
+from expiry_notifier.services.ledger_service import import_info_tags
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy notified_<stage> tags from the AD 'info' attribute into the notification ledger, "
+        "so switching NOTIFICATION_STATE_BACKEND to 'database' doesn't repeat notifications"
+    )
+
+    def handle(self, *args, **options):
+        snapshot = ldap_directory_snapshot(
+            search_filter=get_users_filter(present('info'), present('accountExpires')),
+            attributes=['sAMAccountName', 'mail', 'accountExpires', 'info', 'objectGUID'],
+        )
+        if snapshot.error:
+            raise CommandError(f"LDAP search failed: {snapshot.error}")
+
+        imported = import_info_tags(snapshot)
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {imported} notification tag(s) from {len(snapshot.users)} user(s)"
+        ))
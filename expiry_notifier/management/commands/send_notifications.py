@@ -0,0 +1,46 @@
+import time
+from django.core.management.base import BaseCommand
+from expiry_notifier.services.notification_service import (
+    load_notification_snapshot, plan_notifications, send_notification
+)
+
+
+class Command(BaseCommand):
+    help = "Run the expiry notification job, or with --dry-run only print what it would do"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Compute the full plan without writing to LDAP or sending email",
+        )
+
+    def handle(self, *args, **options):
+        if not options['dry_run']:
+            notified = send_notification()
+            self.stdout.write(self.style.SUCCESS(f"Sent {len(notified)} notification(s)"))
+            return
+
+        started = time.perf_counter()
+        snapshot = load_notification_snapshot()
+        fetched = time.perf_counter()
+        plan = plan_notifications(snapshot)
+        planned = time.perf_counter()
+
+        for user in plan.notifications:
+            self.stdout.write(
+                f"[NOTIFY] {user['username']:<24} {user['email']:<40} "
+                f"stage={user['stage']:<8} days_left={user['days_left']}"
+            )
+            if user.get('new_info'):
+                self.stdout.write(f"[INFO]   {user['username']:<24} set '{user['new_info']}' on {user['dn']} once sent")
+        for change in plan.info_changes:
+            action = "reset" if change.is_reset else f"set '{change.info}'"
+            self.stdout.write(f"[INFO]   {change.username:<24} {action} on {change.dn}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Dry run: {len(snapshot.users)} candidate user(s), {len(plan.notifications)} notification(s), "
+            f"{len(plan.info_changes)} 'info' reset(s). "
+            f"Directory fetch {fetched - started:.2f}s "
+            f"({snapshot.ldap_operations} LDAP operations), decision phase {planned - fetched:.3f}s"
+        ))
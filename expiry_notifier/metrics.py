@@ -0,0 +1,93 @@
+import logging
+import os
+import socket
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest,
+    multiprocess, pushadd_to_gateway,
+)
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PHASE_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+LDAP_OPERATIONS = Counter(
+    'expiry_notifier_ldap_operations_total', 'LDAP operations issued', ['operation', 'result']
+)
+LDAP_LATENCY = Histogram(
+    'expiry_notifier_ldap_operation_seconds', 'LDAP operation round-trip time', ['operation'],
+    buckets=LATENCY_BUCKETS,
+)
+SMTP_LATENCY = Histogram(
+    'expiry_notifier_smtp_send_seconds', 'Time to hand one message to the SMTP relay', buckets=LATENCY_BUCKETS
+)
+EMAILS = Counter('expiry_notifier_emails_total', 'Notification emails by stage and outcome', ['stage', 'result'])
+PHASE_DURATION = Histogram(
+    'expiry_notifier_phase_seconds', 'Duration of each notification run phase', ['phase'], buckets=PHASE_BUCKETS
+)
+LAST_RUN = Gauge(
+    'expiry_notifier_last_run_timestamp_seconds', 'Completion time of the last notification run',
+    multiprocess_mode='max',
+)
+
+
+@contextmanager
+def track_phase(phase):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        PHASE_DURATION.labels(phase).observe(elapsed)
+        logger.info(f"[TIMING] {phase} took {elapsed:.3f}s")
+
+
+@contextmanager
+def track_ldap(operation):
+    started = time.perf_counter()
+    result = 'success'
+    try:
+        yield
+    except Exception:
+        result = 'error'
+        raise
+    finally:
+        LDAP_LATENCY.labels(operation).observe(time.perf_counter() - started)
+        LDAP_OPERATIONS.labels(operation, result).inc()
+
+
+def get_registry():
+    # gunicorn/Celery prefork children each hold their own counters; with
+    # PROMETHEUS_MULTIPROC_DIR set they are aggregated from the shared directory
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return REGISTRY
+
+
+def render_metrics() -> tuple[bytes, str]:
+    return generate_latest(get_registry()), CONTENT_TYPE_LATEST
+
+
+def push_metrics():
+    gateway = getattr(settings, 'PROMETHEUS_PUSHGATEWAY_URL', '')
+    if not gateway:
+        return
+    # An aggregated multiprocess registry is pushed once per host, a per-process one per pid
+    instance = socket.gethostname()
+    if not os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        instance = f'{instance}:{os.getpid()}'
+    try:
+        pushadd_to_gateway(
+            gateway,
+            job='expiry_notifier',
+            registry=get_registry(),
+            grouping_key={'instance': instance},
+            timeout=5,
+        )
+    except Exception as e:
+        logger.warning(f"[METRICS] Push to {gateway} failed: {e}")
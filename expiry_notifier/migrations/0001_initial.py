@@ -0,0 +1,46 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DirectorySyncState',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('server', models.CharField(max_length=256)),
+                ('highest_usn', models.BigIntegerField(default=0)),
+                ('last_sync_at', models.DateTimeField(blank=True, null=True)),
+                ('last_full_sync_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='DirectoryUserRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guid', models.CharField(max_length=36, unique=True)),
+                ('dn', models.TextField()),
+                ('username', models.CharField(db_index=True, max_length=256)),
+                ('email', models.CharField(blank=True, db_index=True, max_length=256)),
+                ('name', models.CharField(blank=True, max_length=256)),
+                ('first_name', models.CharField(blank=True, max_length=256)),
+                ('last_name', models.CharField(blank=True, max_length=256)),
+                ('expires_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('disabled', models.BooleanField(default=False)),
+                ('is_admin', models.BooleanField(default=False)),
+                ('info', models.TextField(blank=True)),
+                ('usn_changed', models.BigIntegerField(default=0)),
+                ('synced_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['disabled', 'is_admin'], name='expiry_noti_disable_d2dfc9_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.2.23 on 2026-10-18 11:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expiry_notifier', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('guid', models.CharField(max_length=36)),
+                ('expires_at', models.DateTimeField()),
+                ('stage', models.CharField(max_length=32)),
+                ('email', models.CharField(blank=True, max_length=256)),
+                ('message_id', models.CharField(blank=True, db_index=True, max_length=256)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['expires_at'], name='expiry_noti_expires_19ca32_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='notificationledger',
+            constraint=models.UniqueConstraint(fields=('guid', 'expires_at', 'stage'), name='unique_notification_per_stage'),
+        ),
+    ]
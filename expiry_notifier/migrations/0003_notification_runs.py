@@ -0,0 +1,39 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:00
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expiry_notifier', '0002_notification_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('admin_emails', models.JSONField(default=list)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='NotificationRunItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('email', models.CharField(max_length=256)),
+                ('stage', models.CharField(max_length=32)),
+                ('state', models.CharField(choices=[('planned', 'planned'), ('rendered', 'rendered'), ('sent', 'sent'), ('acknowledged', 'acknowledged'), ('failed', 'failed')], default='planned', max_length=16)),
+                ('payload', models.JSONField()),
+                ('error', models.TextField(blank=True)),
+                ('updated_at', models.DateTimeField()),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='expiry_notifier.notificationrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['run', 'state'], name='expiry_noti_run_id_26ec69_idx')],
+            },
+        ),
+    ]
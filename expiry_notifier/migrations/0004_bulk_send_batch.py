@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-18 12:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expiry_notifier', '0003_notification_runs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkSendBatch',
+            fields=[
+                ('id', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('status', models.CharField(default='queued', max_length=16)),
+                ('requested_by', models.CharField(blank=True, max_length=150)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('sent', models.PositiveIntegerField(default=0)),
+                ('failed', models.PositiveIntegerField(default=0)),
+                ('errors', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
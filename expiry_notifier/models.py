@@ -0,0 +1,158 @@
+from django.db import models
+from expiry_notifier.services.directory import DirectoryUser
+
+
+class DirectoryUserRecord(models.Model):
+    guid = models.CharField(max_length=36, unique=True)
+    dn = models.TextField()
+    username = models.CharField(max_length=256, db_index=True)
+    email = models.CharField(max_length=256, db_index=True, blank=True)
+    name = models.CharField(max_length=256, blank=True)
+    first_name = models.CharField(max_length=256, blank=True)
+    last_name = models.CharField(max_length=256, blank=True)
+    expires_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    disabled = models.BooleanField(default=False)
+    is_admin = models.BooleanField(default=False)
+    info = models.TextField(blank=True)
+    usn_changed = models.BigIntegerField(default=0)
+    synced_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['disabled', 'is_admin']),
+        ]
+
+    def __str__(self):
+        return self.username
+
+    @classmethod
+    def from_directory_user(cls, user: DirectoryUser, synced_at):
+        return cls(
+            guid=user.guid,
+            dn=user.dn,
+            username=user.username,
+            email=user.email,
+            name=user.name,
+            first_name=user.first_name,
+            last_name=user.last_name,
+            expires_at=user.expires_at,
+            disabled=user.disabled,
+            is_admin=user.is_admin,
+            info=user.info,
+            usn_changed=user.usn_changed,
+            synced_at=synced_at,
+        )
+
+    def to_directory_user(self, current_time) -> DirectoryUser:
+        return DirectoryUser(
+            username=self.username,
+            email=self.email,
+            name=self.name,
+            first_name=self.first_name,
+            last_name=self.last_name,
+            expires_at=self.expires_at,
+            expired=bool(self.expires_at and self.expires_at <= current_time),
+            disabled=self.disabled,
+            is_admin=self.is_admin,
+            info=self.info,
+            guid=self.guid,
+            dn=self.dn,
+            usn_changed=self.usn_changed,
+        )
+
+
+class DirectorySyncState(models.Model):
+    server = models.CharField(max_length=256)
+    highest_usn = models.BigIntegerField(default=0)
+    last_sync_at = models.DateTimeField(null=True, blank=True)
+    last_full_sync_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.server} @ {self.highest_usn}"
+
+
+class BulkSendBatch(models.Model):
+    # Progress of a dashboard bulk send, written by the Celery worker and polled by the web workers
+    id = models.CharField(max_length=32, primary_key=True)
+    status = models.CharField(max_length=16, default='queued')
+    requested_by = models.CharField(max_length=150, blank=True)
+    total = models.PositiveIntegerField(default=0)
+    sent = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    errors = models.JSONField(default=list)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Bulk send {self.id}: {self.status}"
+
+    def to_progress(self) -> dict:
+        return {
+            'id': self.id,
+            'status': self.status,
+            'requested_by': self.requested_by,
+            'total': self.total,
+            'sent': self.sent,
+            'failed': self.failed,
+            'errors': self.errors,
+            'created_at': self.created_at.isoformat(),
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+        }
+
+
+class NotificationLedger(models.Model):
+    # One row per (account, expiry cycle, stage). The cycle is the accountExpires value the
+    # notification was about, so renewing an account starts a fresh cycle without any reset
+    guid = models.CharField(max_length=36)
+    expires_at = models.DateTimeField()
+    stage = models.CharField(max_length=32)
+    email = models.CharField(max_length=256, blank=True)
+    message_id = models.CharField(max_length=256, blank=True, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['guid', 'expires_at', 'stage'], name='unique_notification_per_stage'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at']),
+        ]
+
+    def __str__(self):
+        return f"{self.guid} {self.stage} @ {self.expires_at:%Y-%m-%d}"
+
+
+class NotificationRun(models.Model):
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    admin_emails = models.JSONField(default=list)
+
+    def __str__(self):
+        return f"Run {self.pk} @ {self.started_at:%Y-%m-%d %H:%M}"
+
+
+class NotificationRunItem(models.Model):
+    PLANNED = 'planned'
+    RENDERED = 'rendered'
+    SENT = 'sent'
+    ACKNOWLEDGED = 'acknowledged'
+    FAILED = 'failed'
+    STATES = [(state, state) for state in (PLANNED, RENDERED, SENT, ACKNOWLEDGED, FAILED)]
+
+    run = models.ForeignKey(NotificationRun, on_delete=models.CASCADE, related_name='items')
+    email = models.CharField(max_length=256)
+    stage = models.CharField(max_length=32)
+    state = models.CharField(max_length=16, choices=STATES, default=PLANNED)
+    # The planned notification as handed to delivery, so a resumed run needs no directory access
+    payload = models.JSONField()
+    error = models.TextField(blank=True)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['run', 'state']),
+        ]
+
+    def __str__(self):
+        return f"{self.email} {self.stage}: {self.state}"
@@ -0,0 +1,72 @@
+import logging
+import threading
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+from expiry_notifier.services.directory import DirectorySnapshot
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_CACHE_KEY = 'expiry_notifier:directory_snapshot'
+# Bump whenever DirectorySnapshot/DirectoryUser fields change so old pickles are ignored
+SNAPSHOT_CACHE_VERSION = 5
+REFRESH_LOCK_KEY = 'expiry_notifier:directory_snapshot:refresh'
+
+
+def get_cache_ttl():
+    return getattr(settings, 'DIRECTORY_CACHE_TTL', 300)
+
+
+def get_stale_ttl():
+    return getattr(settings, 'DIRECTORY_CACHE_STALE_TTL', 900)
+
+
+def store_snapshot(snapshot: DirectorySnapshot):
+    if snapshot.error:
+        logger.warning(f"[CACHE] Not caching failed directory snapshot: {snapshot.error}")
+        return
+    cache.set(SNAPSHOT_CACHE_KEY, snapshot, get_cache_ttl() + get_stale_ttl(), version=SNAPSHOT_CACHE_VERSION)
+
+
+def refresh_snapshot(loader) -> DirectorySnapshot:
+    snapshot = loader()
+    store_snapshot(snapshot)
+    return snapshot
+
+
+def peek_cached_snapshot() -> DirectorySnapshot | None:
+    return cache.get(SNAPSHOT_CACHE_KEY, version=SNAPSHOT_CACHE_VERSION)
+
+
+def get_cached_snapshot(loader) -> DirectorySnapshot:
+    snapshot = peek_cached_snapshot()
+    if snapshot is None:
+        logger.info("[CACHE] Directory snapshot miss, loading from LDAP")
+        return refresh_snapshot(loader)
+
+    age = (datetime.now(timezone.utc) - snapshot.taken_at).total_seconds()
+    if age > get_cache_ttl():
+        # Serve the stale copy and let one worker rebuild it in the background
+        schedule_refresh(loader)
+    return snapshot
+
+
+def schedule_refresh(loader):
+    if not cache.add(REFRESH_LOCK_KEY, True, getattr(settings, 'LDAP_RECEIVE_TIMEOUT', 30) * 2):
+        return
+
+    def refresh():
+        try:
+            refresh_snapshot(loader)
+            logger.info("[CACHE] Directory snapshot refreshed in background")
+        except Exception as e:
+            logger.error(f"[CACHE] Background snapshot refresh failed: {e}")
+        finally:
+            cache.delete(REFRESH_LOCK_KEY)
+
+    threading.Thread(target=refresh, name='directory-snapshot-refresh', daemon=True).start()
+
+
+def invalidate_directory_snapshot():
+    cache.delete(SNAPSHOT_CACHE_KEY, version=SNAPSHOT_CACHE_VERSION)
+    logger.info("[CACHE] Directory snapshot invalidated")
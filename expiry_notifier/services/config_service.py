@@ -0,0 +1,138 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from expiry_notifier.services.template_service import NotificationTemplates
+
+logger = logging.getLogger(__name__)
+
+STAGE_ORDER = ('early', 'middle', 'urgent', 'expired')
+MANUAL_KINDS = ('early', 'middle', 'urgent', 'today', 'expired')
+
+_config = None
+_config_lock = threading.Lock()
+_next_check_at = 0.0
+_rejected_mtime_ns = None
+
+
+@dataclass(frozen=True, slots=True)
+class NotificationConfig:
+    version: str
+    path: str
+    mtime_ns: int
+    notification_days: dict
+    stages: tuple
+    templates: NotificationTemplates
+
+    @property
+    def stage_windows(self) -> dict:
+        return {stage: (start, end) for start, end, stage in self.stages}
+
+
+def get_config_path():
+    return str(getattr(settings, 'NOTIFICATION_CONFIG_PATH', settings.BASE_DIR / 'config' / 'config.json'))
+
+
+def validate_config(config: dict):
+    for section in ('notification_days', 'messages', 'manual_notification_settings', 'admin_auto_report'):
+        if not isinstance(config.get(section), dict):
+            raise ImproperlyConfigured(f"config.json: '{section}' must be an object")
+
+    days = config['notification_days']
+    missing = [stage for stage in STAGE_ORDER if not isinstance(days.get(stage), int)]
+    if missing:
+        raise ImproperlyConfigured(f"config.json: notification_days needs integer values for {missing}")
+    thresholds = [days[stage] for stage in STAGE_ORDER]
+    if thresholds != sorted(thresholds, reverse=True) or len(set(thresholds)) != len(thresholds):
+        raise ImproperlyConfigured(
+            f"config.json: notification_days must be strictly decreasing early > middle > urgent > expired, "
+            f"got {thresholds}"
+        )
+
+    missing = [stage for stage in STAGE_ORDER if stage not in config['messages']]
+    if missing:
+        raise ImproperlyConfigured(f"config.json: messages is missing stage(s) {missing}")
+
+    missing = [kind for kind in MANUAL_KINDS if kind not in config['manual_notification_settings']]
+    if missing:
+        raise ImproperlyConfigured(f"config.json: manual_notification_settings is missing {missing}")
+    for kind in MANUAL_KINDS[:-1]:
+        if not isinstance(config['manual_notification_settings'][kind].get('days'), int):
+            raise ImproperlyConfigured(f"config.json: manual_notification_settings.{kind}.days must be an integer")
+
+
+def build_stages(days: dict) -> tuple:
+    return (
+        (days["early"], days["middle"], "early"),
+        (days["middle"], days["urgent"], "middle"),
+        (days["urgent"], days["expired"], "urgent"),
+        (days["expired"], float("-inf"), "expired"),
+    )
+
+
+def load_notification_config(path=None) -> NotificationConfig:
+    path = path or get_config_path()
+    with open(path, 'rb') as f:
+        mtime_ns = os.fstat(f.fileno()).st_mtime_ns
+        raw = f.read()
+
+    try:
+        config = json.loads(raw)
+    except ValueError as e:
+        raise ImproperlyConfigured(f"{path} is not valid JSON: {e}") from e
+
+    validate_config(config)
+    days = {stage: config['notification_days'][stage] for stage in STAGE_ORDER}
+    # Content hash, so every web and Celery process reports the same version for the same file
+    return NotificationConfig(
+        version=hashlib.sha1(raw).hexdigest()[:12],
+        path=path,
+        mtime_ns=mtime_ns,
+        notification_days=days,
+        stages=build_stages(days),
+        templates=NotificationTemplates.from_config(config),
+    )
+
+
+def reload_notification_config(path=None) -> NotificationConfig:
+    global _config
+    new_config = load_notification_config(path)
+    with _config_lock:
+        previous, _config = _config, new_config
+    if previous is None or previous.version != new_config.version:
+        logger.info(f"[CONFIG] Loaded notification config {new_config.version} from {new_config.path}")
+    return new_config
+
+
+def get_notification_config() -> NotificationConfig:
+    global _next_check_at, _rejected_mtime_ns
+    config = _config
+    if config is None:
+        return reload_notification_config()
+
+    # At most one stat() per interval; between checks this is a clock read and a comparison
+    now = time.monotonic()
+    if now < _next_check_at:
+        return config
+    _next_check_at = now + getattr(settings, 'NOTIFICATION_CONFIG_CHECK_INTERVAL', 5)
+
+    try:
+        mtime_ns = os.stat(config.path).st_mtime_ns
+    except OSError as e:
+        logger.error(f"[CONFIG] Cannot stat {config.path}, keeping {config.version}: {e}")
+        return config
+    if mtime_ns in (config.mtime_ns, _rejected_mtime_ns):
+        return config
+
+    try:
+        return reload_notification_config(config.path)
+    except (OSError, ImproperlyConfigured) as e:
+        # Keep serving the last good snapshot until the file is fixed; don't retry the same broken file
+        _rejected_mtime_ns = mtime_ns
+        logger.error(f"[CONFIG] Ignoring invalid notification config, keeping {config.version}: {e}")
+        return config
@@ -0,0 +1,75 @@
+from array import array
+from bisect import bisect_left
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from expiry_notifier.utils.time_util import datetime_to_filetime
+
+
+@dataclass(slots=True)
+class DirectoryUser:
+    username: str
+    email: str
+    name: str = ''
+    first_name: str = ''
+    last_name: str = ''
+    expires_at: datetime | None = None
+    expired: bool = False
+    disabled: bool = False
+    is_admin: bool = False
+    info: str = ''
+    guid: str = ''
+    dn: str = ''
+    usn_changed: int = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'name': self.name,
+            'email': self.email,
+            'username': self.username,
+            'first_name': self.first_name,
+            'last_name': self.last_name,
+            'expired': self.expired,
+            'disabled': self.disabled,
+            'is_admin': self.is_admin,
+            'account_expires_raw': self.expires_at.isoformat() if self.expires_at else None,
+        }
+
+
+@dataclass(slots=True)
+class DirectorySnapshot:
+    users: list[DirectoryUser] = field(default_factory=list)
+    admins: list[DirectoryUser] = field(default_factory=list)
+    taken_at: datetime = field(default_factory=lambda: datetime.now(timezone.utc))
+    ldap_operations: int = 0
+    error: str = ''
+    by_email: dict[str, DirectoryUser] = field(default_factory=dict, repr=False)
+    expiry_index: list[DirectoryUser] = field(default_factory=list, repr=False)
+    expiry_keys: list[float] = field(default_factory=list, repr=False)
+    # accountExpires of each entry in `expiry_index`, same order, as one int64 FILETIME buffer
+    expiry_filetimes: array = field(default_factory=lambda: array('q'), repr=False)
+    info_index: list[DirectoryUser] = field(default_factory=list, repr=False)
+
+    @property
+    def admin_emails(self) -> list[str]:
+        return [admin.email for admin in self.admins if admin.email]
+
+    def build_indexes(self):
+        everyone = self.users + self.admins
+        self.by_email = {user.email.lower(): user for user in everyone if user.email}
+        self.expiry_index = sorted(
+            (user for user in everyone if user.expires_at),
+            key=lambda user: user.expires_at
+        )
+        self.expiry_keys = [user.expires_at.timestamp() for user in self.expiry_index]
+        self.expiry_filetimes = array('q', (datetime_to_filetime(user.expires_at) for user in self.expiry_index))
+        self.info_index = [user for user in self.users if user.info]
+
+    def expiry_range(self, start: datetime | None = None, end: datetime | None = None) -> tuple[int, int]:
+        # Slice of expiry_index with start <= expires_at < end; None leaves a side open
+        lo = bisect_left(self.expiry_keys, start.timestamp()) if start else 0
+        hi = bisect_left(self.expiry_keys, end.timestamp()) if end else len(self.expiry_keys)
+        return lo, hi
+
+    def expiring_between(self, start: datetime | None = None, end: datetime | None = None) -> list[DirectoryUser]:
+        lo, hi = self.expiry_range(start, end)
+        return self.expiry_index[lo:hi]
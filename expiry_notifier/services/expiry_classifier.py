@@ -0,0 +1,35 @@
+from bisect import bisect_left
+from datetime import datetime
+from expiry_notifier.utils.time_util import FILETIME_TICKS_PER_DAY, datetime_to_filetime
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def stage_bounds(stages) -> tuple[list[int], list[str]]:
+    # Stages are contiguous (start, end, name) windows with start >= days_left > end.
+    # Sorted by start, the stage of `days_left` is the first one whose start is >= it.
+    ordered = sorted(stages, key=lambda stage: stage[0])
+    return [start for start, _, _ in ordered], [name for _, _, name in ordered]
+
+
+def classify_expiry(filetimes, stages, now: datetime) -> tuple[list[int], list[str | None]]:
+    # Days left are floored exactly like (expires - now).days; accounts before the earliest stage get None
+    now_filetime = datetime_to_filetime(now)
+    bounds, names = stage_bounds(stages)
+    names.append(None)
+
+    if np is not None:
+        # array('q') exposes its buffer, so this is a view rather than a per-element conversion
+        values = np.asarray(filetimes, dtype=np.int64)
+        days = (values - now_filetime) // FILETIME_TICKS_PER_DAY
+        positions = np.searchsorted(np.asarray(bounds, dtype=np.int64), days, side='left')
+        # Back to plain ints: the results end up in JSON task payloads
+        days_left, positions = days.tolist(), positions.tolist()
+    else:
+        days_left = [(value - now_filetime) // FILETIME_TICKS_PER_DAY for value in filetimes]
+        positions = [bisect_left(bounds, days) for days in days_left]
+
+    return days_left, [names[position] for position in positions]
@@ -0,0 +1,110 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db.models import Max, Q
+from expiry_notifier.models import NotificationRun, NotificationRunItem
+
+logger = logging.getLogger(__name__)
+
+# Items a run still owes: anything not yet acknowledged or given up on
+OPEN_STATES = (NotificationRunItem.PLANNED, NotificationRunItem.RENDERED, NotificationRunItem.SENT)
+
+
+def prune_runs() -> int:
+    # Items carry the full rendered payload, so finished runs are only kept for NOTIFICATION_RUN_RETENTION_DAYS
+    cutoff = datetime.now(timezone.utc) - timedelta(days=getattr(settings, 'NOTIFICATION_RUN_RETENTION_DAYS', 30))
+    deleted, _ = NotificationRun.objects.filter(finished_at__lt=cutoff).delete()
+    return deleted
+
+
+def start_run(notifications: list[dict], admin_emails: list[str]) -> NotificationRun | None:
+    prune_runs()
+    if not notifications:
+        return None
+    now = datetime.now(timezone.utc)
+    run = NotificationRun.objects.create(admin_emails=admin_emails)
+    items = NotificationRunItem.objects.bulk_create([
+        NotificationRunItem(run=run, email=user['email'], stage=user['stage'], payload=user, updated_at=now)
+        for user in notifications
+    ], batch_size=1000)
+    for user, item in zip(notifications, items):
+        user['run_id'] = run.pk
+        user['run_item_id'] = item.pk
+    logger.info(f"[JOURNAL] Run {run.pk} started with {len(items)} planned notification(s)")
+    return run
+
+
+def in_flight_keys() -> set[tuple[str, str]]:
+    # (email, stage) pairs an unfinished run has planned but not yet settled. Those are
+    # left to that run (or its resumption) so two runs never mail the same stage twice
+    return set(
+        NotificationRunItem.objects
+        .filter(run__finished_at__isnull=True, state__in=OPEN_STATES)
+        .values_list('email', 'stage')
+    )
+
+
+def item_states(notifications: list[dict]) -> dict[int, str]:
+    ids = [user['run_item_id'] for user in notifications if user.get('run_item_id')]
+    return dict(NotificationRunItem.objects.filter(pk__in=ids).values_list('pk', 'state'))
+
+
+def set_state(item_ids, state, error=''):
+    if item_ids:
+        NotificationRunItem.objects.filter(pk__in=item_ids).update(
+            state=state, error=error, updated_at=datetime.now(timezone.utc)
+        )
+
+
+def stale_cutoff() -> datetime:
+    return datetime.now(timezone.utc) - timedelta(seconds=getattr(settings, 'NOTIFICATION_RUN_STALE_AFTER', 3600))
+
+
+def stale_runs():
+    # A run whose items haven't moved for NOTIFICATION_RUN_STALE_AFTER seconds was interrupted
+    # (worker crash, Celery time limit); anything younger may still be in progress
+    cutoff = stale_cutoff()
+    return (
+        NotificationRun.objects
+        .filter(finished_at__isnull=True)
+        .annotate(last_activity=Max('items__updated_at'))
+        .filter(Q(last_activity__lt=cutoff) | Q(last_activity__isnull=True, started_at__lt=cutoff))
+        .order_by('started_at')
+    )
+
+
+def claim_run(run: NotificationRun) -> bool:
+    # Touching the open items makes the run look active again, so of two workers resuming
+    # at the same time only the one whose update went through carries on
+    claimed = run.items.filter(state__in=OPEN_STATES, updated_at__lt=stale_cutoff()).update(
+        updated_at=datetime.now(timezone.utc)
+    )
+    if not claimed and run.items.filter(state__in=OPEN_STATES).exists():
+        return False
+    return True
+
+
+def run_notifications(run: NotificationRun, states=None) -> list[dict]:
+    items = run.items.order_by('pk')
+    if states:
+        items = items.filter(state__in=states)
+    notifications = []
+    for item in items.iterator():
+        user = dict(item.payload, run_id=run.pk, run_item_id=item.pk)
+        user['email_sent'] = item.state in (NotificationRunItem.SENT, NotificationRunItem.ACKNOWLEDGED)
+        notifications.append(user)
+    return notifications
+
+
+def complete_run(run_id) -> bool:
+    # Items still open (sent but not acknowledged, or never reached) keep the run unfinished,
+    # so it goes stale and the next run picks it up
+    if not run_id:
+        return False
+    open_items = NotificationRunItem.objects.filter(run_id=run_id, state__in=OPEN_STATES).count()
+    if open_items:
+        logger.warning(f"[JOURNAL] Run {run_id} left open with {open_items} unsettled notification(s)")
+        return False
+    NotificationRun.objects.filter(pk=run_id, finished_at__isnull=True).update(finished_at=datetime.now(timezone.utc))
+    logger.info(f"[JOURNAL] Run {run_id} finished")
+    return True
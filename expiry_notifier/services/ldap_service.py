@@ -1,132 +1,227 @@
 import logging
 import os
+import uuid
 from datetime import datetime, timezone
-from django.http import JsonResponse
-from expiry_notifier.ldap.ldap_connector import get_ldap_connection
+from expiry_notifier.ldap.ldap_connector import get_operation_count, ldap_connection
+from expiry_notifier.ldap.query_builder import (
+    and_, enabled_users, equals, expires_between, member_of, never_expires, not_, or_, present
+)
+from expiry_notifier.metrics import track_ldap
+from expiry_notifier.services.directory import DirectorySnapshot, DirectoryUser
+from expiry_notifier.utils.time_util import parse_account_expires
 from django.conf import settings
+from ldap3.core.exceptions import LDAPSizeLimitExceededResult
 
 logger = logging.getLogger(__name__)
 
+PAGED_RESULTS_CONTROL = '1.2.840.113556.1.4.319'
 
-def ldap_users() -> JsonResponse | None:
+# Everything the mirror stores; the directory sync and single-user lookups need all of it
+USER_ATTRIBUTES = [
+    'cn',
+    'mail',
+    'accountExpires',
+    'userAccountControl',
+    'sAMAccountName',
+    'givenName',
+    'sn',
+    'memberOf',
+    'info',
+    'objectGUID',
+    'uSNChanged'
+]
+
+# Snapshot searches run separately for admins and everyone else, so the (often long)
+# memberOf list isn't needed, and disabled accounts are already excluded by the filter
+DIRECTORY_ATTRIBUTES = ['cn', 'mail', 'accountExpires', 'sAMAccountName', 'givenName', 'sn']
+NOTIFICATION_ATTRIBUTES = DIRECTORY_ATTRIBUTES + ['info']
+# With the database ledger, notification state is keyed by objectGUID and 'info' is never read
+LEDGER_NOTIFICATION_ATTRIBUTES = DIRECTORY_ATTRIBUTES + ['objectGUID']
+
+
+def get_admin_group_dn():
+    return getattr(
+        settings, 'LDAP_ADMIN_GROUP_DN',
+        f'CN=Domain Admins,CN=Users,{os.getenv("AUTH_LDAP_BASE_DN")}'
+    )
+
+
+def get_directory_filter():
+    return enabled_users()
+
+
+def get_admin_filter(*clauses):
+    return and_(get_directory_filter(), member_of(get_admin_group_dn()), *clauses)
+
+
+def get_users_filter(*clauses):
+    # Non-admin accounts, optionally limited to members of LDAP_USER_GROUP_DN
+    group_dn = getattr(settings, 'LDAP_USER_GROUP_DN', '')
+    return and_(
+        get_directory_filter(),
+        not_(member_of(get_admin_group_dn())),
+        member_of(group_dn, nested=getattr(settings, 'LDAP_NESTED_GROUPS', False)) if group_dn else '',
+        *clauses,
+    )
+
+
+def get_expiry_candidates_filter(start: datetime | None, end: datetime, renewed_tags=True):
+    # Users with an address who either expire in [start, end) or were renewed past the window
+    # (or to "never expires") while still carrying notification tags in 'info' (those get the tags cleared)
+    renewed = and_(present('info'), or_(expires_between(end), never_expires())) if renewed_tags else ''
+    return get_users_filter(present('mail'), or_(expires_between(start, end), renewed))
+
+
+def is_admin_entry(entry, admin_group_dn):
+    if not hasattr(entry, 'memberOf'):
+        return False
+    return any(str(group).lower() == admin_group_dn for group in entry.memberOf.values)
+
+
+def parse_guid(entry):
+    if not hasattr(entry, 'objectGUID') or not entry.objectGUID.raw_values:
+        return ''
+    raw = entry.objectGUID.raw_values[0]
+    if len(raw) == 16:
+        return str(uuid.UUID(bytes_le=raw))
+    return raw.decode(errors='ignore').strip('{}').lower()
+
+
+def first_value(entry, attribute, default=''):
+    # Requested attributes the entry doesn't have come back as empty value lists
+    values = getattr(entry, attribute, None)
+    return values[0] if values else default
+
+
+def process_entry(entry, admin_group_dn, current_time=None, is_admin=None) -> DirectoryUser | None:
+    current_time = current_time or datetime.now(timezone.utc)
     try:
-        conn = get_ldap_connection()
-        search_base = settings.AUTH_LDAP_BASE_DN
-
-        user_filter = (
-            '(&'
-            '(objectClass=user)'
-            '(!(userAccountControl:1.2.840.113556.1.4.803:=2))'
-            f'(!(memberOf=CN=Domain Admins,CN=Users,{os.getenv("AUTH_LDAP_BASE_DN")}))'
-            ')'
+        user = DirectoryUser(
+            name=first_value(entry, 'cn'),
+            email=first_value(entry, 'mail'),
+            username=first_value(entry, 'sAMAccountName'),
+            first_name=first_value(entry, 'givenName'),
+            last_name=first_value(entry, 'sn'),
+            is_admin=is_admin_entry(entry, admin_group_dn) if is_admin is None else is_admin,
+            guid=parse_guid(entry),
+            dn=entry.entry_dn,
         )
 
-        admin_filter = (
-            '(&'
-            '(objectCategory=person)'
-            '(objectClass=user)'
-            f'(memberOf=CN=Domain Admins,CN=Users,{os.getenv("AUTH_LDAP_BASE_DN")})'
-            ')'
-        )
+        if hasattr(entry, 'uSNChanged') and entry.uSNChanged.value:
+            user.usn_changed = int(entry.uSNChanged.value)
+
+        if hasattr(entry, 'info') and entry.info.value:
+            user.info = str(entry.info.value)
 
-        attributes = [
-            'cn',
-            'mail',
-            'accountExpires',
-            'userAccountControl',
-            'displayName',
-            'sAMAccountName',
-            'givenName',
-            'sn',
-            'memberOf'
-        ]
-
-        conn.search(search_base, user_filter, attributes=attributes)
-        user_entries = conn.entries.copy()
-
-        conn.search(search_base, admin_filter, attributes=attributes)
-        admin_entries = conn.entries.copy()
-
-        users = []
-        admin_users = []
-        current_time = datetime.now(timezone.utc)
-
-        def process_entry(entry, is_admin=False):
+        if hasattr(entry, 'accountExpires'):
             try:
-                user_data = {
-                    'name': getattr(entry, 'cn', [''])[0],
-                    'email': getattr(entry, 'mail', [''])[0],
-                    'username': getattr(entry, 'sAMAccountName', [''])[0],
-                    'first_name': getattr(entry, 'givenName', [''])[0],
-                    'last_name': getattr(entry, 'sn', [''])[0],
-                    'expired': False,
-                    'disabled': False,
-                    'is_admin': is_admin,
-                    'account_expires_raw': None
-                }
-
-                if hasattr(entry, 'accountExpires'):
-                    expiry_value = entry.accountExpires.value
-                    user_data['account_expires_raw'] = expiry_value
-
-                    if expiry_value not in (None, 0, 9223372036854775807):
-                        try:
-                            if isinstance(expiry_value, datetime):
-                                expiry_dt = expiry_value
-                            elif isinstance(expiry_value, str):
-                                expiry_dt = datetime.fromisoformat(expiry_value.replace('Z', '+00:00'))
-                            else:
-                                expiry_value = int(expiry_value)
-                                if expiry_value > 0:
-                                    seconds_since_1601 = expiry_value / 10_000_000
-                                    unix_timestamp = seconds_since_1601 - 11644473600
-                                    expiry_dt = datetime.fromtimestamp(unix_timestamp, timezone.utc)
-                                else:
-                                    expiry_dt = None
-
-                            if expiry_dt:
-                                user_data['expired'] = expiry_dt <= current_time
-
-                        except (ValueError, TypeError, AttributeError) as e:
-                            logger.warning(f"Failed to parse accountExpires for {user_data['username']}: {str(e)}")
-
-                if hasattr(entry, 'userAccountControl'):
-                    uac_value = entry.userAccountControl.value
-                    if uac_value is not None:
-                        try:
-                            uac = int(uac_value)
-                            user_data['disabled'] = bool(uac & 0x0002)
-                        except (ValueError, TypeError):
-                            pass
-                    return user_data
-
-            except Exception as e:
-                logger.error(f"Error processing user {getattr(entry, 'cn', 'unknown')}: {str(e)}")
-                return None
-
-        for entry in user_entries:
-            user_data = process_entry(entry, is_admin=False)
+                user.expires_at = parse_account_expires(entry.accountExpires.value)
+                if user.expires_at:
+                    user.expired = user.expires_at <= current_time
+            except (ValueError, TypeError, AttributeError, OverflowError, OSError) as e:
+                logger.warning(f"Failed to parse accountExpires for {user.username}: {str(e)}")
+
+        if hasattr(entry, 'userAccountControl'):
+            uac_value = entry.userAccountControl.value
+            if uac_value is not None:
+                try:
+                    uac = int(uac_value)
+                    user.disabled = bool(uac & 0x0002)
+                except (ValueError, TypeError):
+                    pass
+
+        return user
+
+    except Exception as e:
+        logger.error(f"Error processing user {getattr(entry, 'cn', 'unknown')}: {str(e)}")
+        return None
+
+
+def iter_ldap_user_pages(
+    conn, search_filter, page_size=None, search_base=None, controls=None, attributes=None, is_admin=None
+):
+    # RFC 2696 paged results: AD truncates unpaged searches at MaxPageSize
+    page_size = page_size or getattr(settings, 'LDAP_PAGE_SIZE', 500)
+    search_base = search_base or settings.AUTH_LDAP_BASE_DN
+    current_time = datetime.now(timezone.utc)
+    admin_group_dn = get_admin_group_dn().lower()
+    cookie = None
+
+    while True:
+        with track_ldap('search'):
+            conn.search(
+                search_base,
+                search_filter,
+                attributes=attributes or USER_ATTRIBUTES,
+                controls=controls,
+                paged_size=page_size,
+                paged_cookie=cookie
+            )
+
+        page = []
+        for entry in conn.entries:
+            user_data = process_entry(entry, admin_group_dn, current_time=current_time, is_admin=is_admin)
             if user_data:
-                users.append(user_data)
-
-        for entry in admin_entries:
-            admin_data = process_entry(entry, is_admin=True)
-            if admin_data:
-                admin_users.append(admin_data)
-
-        return JsonResponse({
-            'status': 'success',
-            'users': users,
-            'admin_users': admin_users,
-            'user_count': len(users),
-            'admin_count': len(admin_users),
-            'timestamp': datetime.now().isoformat()
-        })
+                page.append(user_data)
+        yield page
+
+        response_controls = conn.result.get('controls') or {}
+        cookie = response_controls.get(PAGED_RESULTS_CONTROL, {}).get('value', {}).get('cookie')
+        if not cookie:
+            break
+
+
+def ldap_directory_snapshot(
+    page_size=None, search_filter=None, admin_filter=None, attributes=None, pinned=False
+) -> DirectorySnapshot:
+    snapshot = DirectorySnapshot()
+    searches = (
+        (snapshot.admins, True, admin_filter or get_admin_filter()),
+        (snapshot.users, False, search_filter or get_users_filter()),
+    )
+    try:
+        with ldap_connection(pinned=pinned) as conn:
+            operations_before = get_operation_count(conn)
+
+            for target, is_admin, ldap_filter in searches:
+                for page in iter_ldap_user_pages(
+                    conn, ldap_filter, page_size=page_size,
+                    attributes=attributes or DIRECTORY_ATTRIBUTES, is_admin=is_admin,
+                ):
+                    target.extend(page)
+
+            snapshot.ldap_operations = get_operation_count(conn) - operations_before
+
+        snapshot.build_indexes()
+        logger.info(
+            f"Fetched {len(snapshot.users)} users and {len(snapshot.admins)} admins from LDAP "
+            f"in {snapshot.ldap_operations} LDAP operations"
+        )
 
     except Exception as e:
         logger.error(f"LDAP operation failed: {str(e)}")
-        return JsonResponse({
-            'status': 'error',
-            'message': 'LDAP server operation failed',
-            'details': str(e)
-        }, status=500)
\ No newline at end of file
+        snapshot.error = str(e)
+
+    return snapshot
+
+
+def ldap_find_user_by_email(email) -> DirectoryUser | None:
+    # Equality match on the indexed mail attribute, a single round trip regardless of directory size.
+    # Same scope as the dashboard snapshot, and not paged, so no result set is left open on a pooled
+    # connection; a size limit of 2 is enough to tell a unique address from a shared one
+    with ldap_connection() as conn:
+        try:
+            with track_ldap('search'):
+                conn.search(
+                    settings.AUTH_LDAP_BASE_DN,
+                    get_users_filter(equals('mail', email)),
+                    attributes=USER_ATTRIBUTES,
+                    size_limit=2,
+                )
+        except LDAPSizeLimitExceededResult:
+            pass
+        entries = list(conn.entries)
+
+    if len(entries) > 1:
+        raise ValueError(f"Several directory accounts use {email}")
+    return process_entry(entries[0], get_admin_group_dn().lower(), is_admin=False) if entries else None
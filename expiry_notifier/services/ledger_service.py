@@ -0,0 +1,70 @@
+import logging
+from collections import defaultdict
+from datetime import datetime, timezone
+from django.conf import settings
+from expiry_notifier.models import NotificationLedger
+from expiry_notifier.services.directory import DirectorySnapshot
+
+logger = logging.getLogger(__name__)
+
+INFO_TAG_PREFIX = 'notified_'
+
+
+def uses_notification_ledger():
+    return getattr(settings, 'NOTIFICATION_STATE_BACKEND', 'ldap') == 'database'
+
+
+def load_notified_stages(start: datetime | None, end: datetime) -> dict[tuple[str, datetime], set[str]]:
+    # Every candidate's cycle key is its accountExpires, so one range scan on the
+    # expires_at index covers the whole notification window
+    rows = NotificationLedger.objects.filter(expires_at__lt=end)
+    if start:
+        rows = rows.filter(expires_at__gte=start)
+
+    notified = defaultdict(set)
+    for guid, expires_at, stage in rows.values_list('guid', 'expires_at', 'stage').iterator():
+        notified[(guid, expires_at)].add(stage)
+    return notified
+
+
+def record_sent(notifications: list[dict]) -> int:
+    # Rows are only written once the relay accepted the message, so a crash before that
+    # leaves the stage open for the next run instead of silently marking it notified
+    now = datetime.now(timezone.utc)
+    entries = [
+        NotificationLedger(
+            guid=user['guid'],
+            expires_at=datetime.fromisoformat(user['account_expires_raw']),
+            stage=user['stage'],
+            email=user['email'],
+            message_id=user['message_id'],
+            sent_at=now,
+        )
+        for user in notifications
+        if user.get('email_sent')
+    ]
+    NotificationLedger.objects.bulk_create(entries, ignore_conflicts=True, batch_size=1000)
+    return len(entries)
+
+
+def import_info_tags(snapshot: DirectorySnapshot) -> int:
+    from expiry_notifier.services.config_service import get_notification_config
+    from expiry_notifier.services.notification_service import get_notification_window
+
+    # One-off migration from the 'info' attribute: existing notified_<stage> tags count as
+    # notifications already sent for the account's current expiry date. Accounts renewed
+    # past the window still carry the previous cycle's tags until the daily reset, so
+    # those are skipped instead of suppressing the new cycle's notices
+    _, renewed_from = get_notification_window(get_notification_config(), datetime.now(timezone.utc))
+    entries = [
+        NotificationLedger(
+            guid=user.guid, expires_at=user.expires_at, stage=tag[len(INFO_TAG_PREFIX):], email=user.email
+        )
+        for user in snapshot.users
+        if user.guid and user.expires_at and user.expires_at < renewed_from
+        for tag in user.info.split(';')
+        if tag.startswith(INFO_TAG_PREFIX)
+    ]
+    NotificationLedger.objects.bulk_create(entries, ignore_conflicts=True, batch_size=1000)
+    logger.info(f"[LEDGER] Imported {len(entries)} notification tag(s) from 'info'")
+    return len(entries)
@@ -0,0 +1,165 @@
+import logging
+import uuid
+from datetime import date, datetime, timedelta, timezone
+from django.conf import settings
+from django.utils.html import strip_tags
+from expiry_notifier.metrics import EMAILS
+from expiry_notifier.models import BulkSendBatch
+from expiry_notifier.services.config_service import get_notification_config
+from expiry_notifier.services.directory import DirectorySnapshot, DirectoryUser
+from expiry_notifier.services.notification_service import build_email, send_emails
+from expiry_notifier.services.user_service import query_users
+
+logger = logging.getLogger(__name__)
+
+# Finished batches are kept this long so their progress page stays reachable
+BULK_PROGRESS_RETENTION = timedelta(days=1)
+
+
+def manual_notification_type(expired_days, manual_config) -> str | None:
+    if expired_days > manual_config['early'].days:
+        return 'early'
+    if expired_days > manual_config['middle'].days:
+        return 'middle'
+    # Everything between "today" and the middle stage is urgent, including the last `urgent.days`
+    if expired_days > manual_config['today'].days:
+        return 'urgent'
+    if expired_days == manual_config['today'].days:
+        return 'today'
+    if expired_days < 0:
+        return 'expired'
+    return None
+
+
+def build_manual_email(username, email, expiry_date: date, templates, today: date):
+    expired_days = (expiry_date - today).days
+    context = {
+        'username': username or 'user',
+        'expired_days': expired_days,
+        'days_overdue': abs(expired_days) if expired_days < 0 else 0,
+        'expiry_date': expiry_date.strftime('%Y-%m-%d'),
+        'current_date': today.strftime('%Y-%m-%d')
+    }
+
+    notification_type = manual_notification_type(expired_days, templates.manual)
+    if notification_type is None:
+        raise ValueError(f"No manual notification template for {expired_days} day(s) left")
+    notification_config = templates.manual[notification_type]
+
+    formatted_content = notification_config.render(context)
+    context.update({
+        'subject': formatted_content.pop('subject'),
+        'urgency_level': notification_config.urgency_level,
+        'message_type': notification_config.message_type,
+        'email_content': formatted_content
+    })
+
+    html_message = templates.manual_user_html.render(context)
+    return build_email(context['subject'], email, html_message, strip_tags(html_message))
+
+
+def resolve_bulk_recipients(snapshot: DirectorySnapshot, emails=None, **filters) -> list[DirectoryUser]:
+    # Either an explicit selection from the dashboard or everything matching its current filters
+    if emails is not None:
+        candidates = [snapshot.by_email.get(email.strip().lower()) for email in emails]
+    else:
+        candidates = query_users(snapshot, **filters)
+
+    recipients, seen = [], set()
+    for user in candidates:
+        if user is None or user.is_admin or not (user.email and user.expires_at):
+            continue
+        key = user.email.lower()
+        if key not in seen:
+            seen.add(key)
+            recipients.append(user)
+    return recipients
+
+
+def get_bulk_progress(batch_id) -> dict | None:
+    # Kept in the database rather than the cache: the worker that sends and the web
+    # worker that renders the page rarely share a process
+    batch = BulkSendBatch.objects.filter(pk=batch_id).first()
+    return batch.to_progress() if batch else None
+
+
+def save_bulk_progress(progress: dict):
+    finished_at = progress.get('finished_at')
+    BulkSendBatch.objects.update_or_create(pk=progress['id'], defaults={
+        'status': progress['status'],
+        'requested_by': progress.get('requested_by', ''),
+        'total': progress['total'],
+        'sent': progress.get('sent', 0),
+        'failed': progress.get('failed', 0),
+        'errors': progress.get('errors', []),
+        'finished_at': datetime.fromisoformat(finished_at) if finished_at else None,
+    })
+
+
+def start_bulk_send(recipients: list[DirectoryUser], requested_by='') -> dict:
+    from expiry_notifier.tasks import send_bulk_notification_task
+
+    progress = {
+        'id': uuid.uuid4().hex,
+        'status': 'queued',
+        'requested_by': requested_by,
+        'total': len(recipients),
+        'sent': 0,
+        'failed': 0,
+        'errors': [],
+        'created_at': datetime.now(timezone.utc).isoformat(),
+        'finished_at': None,
+    }
+    BulkSendBatch.objects.filter(created_at__lt=datetime.now(timezone.utc) - BULK_PROGRESS_RETENTION).delete()
+    save_bulk_progress(progress)
+
+    # Only what rendering needs goes over the broker; the worker renders with its cached templates
+    payload = [
+        {'username': user.username, 'email': user.email, 'expiry_date': user.expires_at.date().isoformat()}
+        for user in recipients
+    ]
+    send_bulk_notification_task.delay(progress['id'], payload)
+    logger.info(f"[BULK SEND] Batch {progress['id']} queued by {requested_by}: {len(payload)} recipient(s)")
+    return progress
+
+
+def send_bulk_notifications(batch_id, recipients: list[dict]) -> dict:
+    progress = get_bulk_progress(batch_id) or {
+        'id': batch_id, 'requested_by': '', 'total': len(recipients), 'errors': [],
+        'created_at': datetime.now(timezone.utc).isoformat(),
+    }
+    progress.update({'status': 'running', 'sent': 0, 'failed': 0, 'finished_at': None})
+    save_bulk_progress(progress)
+
+    templates = get_notification_config().templates
+    today = datetime.now().date()
+    emails = []
+    for recipient in recipients:
+        try:
+            emails.append(build_manual_email(
+                recipient['username'], recipient['email'], date.fromisoformat(recipient['expiry_date']),
+                templates, today,
+            ))
+        except Exception as e:
+            progress['failed'] += 1
+            progress['errors'].append(f"{recipient['email']}: {e}")
+            EMAILS.labels('manual', 'failed').inc()
+
+    # Progress is published once per SMTP session rather than per message
+    batch_size = max(1, getattr(settings, 'EMAIL_BATCH_SIZE', 100))
+    max_per_second = getattr(settings, 'EMAIL_MAX_PER_SECOND', 0)
+    for offset in range(0, len(emails), batch_size):
+        for result in send_emails(emails[offset:offset + batch_size], max_per_second=max_per_second):
+            if result['sent']:
+                progress['sent'] += 1
+            else:
+                progress['failed'] += 1
+                progress['errors'].append(f"{', '.join(result['to'])}: {result['error']}")
+            EMAILS.labels('manual', 'sent' if result['sent'] else 'failed').inc()
+        save_bulk_progress(progress)
+
+    progress['status'] = 'finished'
+    progress['finished_at'] = datetime.now(timezone.utc).isoformat()
+    save_bulk_progress(progress)
+    logger.info(f"[BULK SEND] Batch {batch_id} finished: {progress['sent']} sent, {progress['failed']} failed")
+    return progress
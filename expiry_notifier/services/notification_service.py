@@ -1,63 +1,107 @@
-import json
 import logging
-from datetime import datetime, timezone
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from expiry_notifier.ldap.ldap_connector import get_ldap_connection
-from expiry_notifier.services.user_service import get_users
-from expiry_notifier.utils.html_utils import format_string, generate_user_table
-from expiry_notifier.utils.ldap_utils import get_user_dn, get_user_info, reset_user_info, update_user_info
-from expiry_notifier.utils.time_util import get_expiry_date
+import smtplib
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.core.mail.utils import DNS_NAME
+from expiry_notifier.metrics import EMAILS, LAST_RUN, SMTP_LATENCY, track_phase
+from expiry_notifier.models import NotificationRun, NotificationRunItem
+from expiry_notifier.services.cache_service import invalidate_directory_snapshot
+from expiry_notifier.services.directory import DirectorySnapshot
+from expiry_notifier.services.expiry_classifier import classify_expiry
+from expiry_notifier.services.config_service import get_notification_config
+from expiry_notifier.services.journal_service import (
+    claim_run, complete_run, in_flight_keys, item_states, run_notifications, set_state, stale_runs, start_run
+)
+from expiry_notifier.services.ledger_service import load_notified_stages, record_sent, uses_notification_ledger
+from expiry_notifier.services.user_service import get_expiry_candidates_snapshot
+from expiry_notifier.utils.html_utils import generate_user_table
+from expiry_notifier.utils.ldap_utils import InfoChange, apply_info_changes
 from ldap_notify.settings import DEFAULT_FROM_EMAIL
-from expiry_notifier.services.user_service import get_admin_users
 from django.utils.html import strip_tags
+from email.utils import make_msgid
 
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
-with open("config.json", encoding="utf-8") as f:
-    config = json.load(f)
 
-NOTIFICATION_DAYS = config["notification_days"]
-MESSAGES = config["messages"]
+@dataclass(slots=True)
+class NotificationPlan:
+    notifications: list[dict] = field(default_factory=list)
+    # Only the renewal resets; notified_<stage> tags are written once the email went out
+    info_changes: list[InfoChange] = field(default_factory=list)
 
-STAGES = [
-    (NOTIFICATION_DAYS["early"], NOTIFICATION_DAYS["middle"], "early"),
-    (NOTIFICATION_DAYS["middle"], NOTIFICATION_DAYS["urgent"], "middle"),
-    (NOTIFICATION_DAYS["urgent"], NOTIFICATION_DAYS["expired"], "urgent"),
-    (NOTIFICATION_DAYS["expired"], float("-inf"), "expired")
-]
 
+def get_notification_window(config, now: datetime) -> tuple[datetime | None, datetime]:
+    # Only accounts within the earliest stage can be notified; already expired ones are
+    # still picked up for NOTIFICATION_EXPIRED_LOOKBACK_DAYS (0 = no lower bound)
+    lookback = getattr(settings, 'NOTIFICATION_EXPIRED_LOOKBACK_DAYS', 1)
+    start = now - timedelta(days=lookback) if lookback else None
+    return start, now + timedelta(days=config.notification_days["early"] + 1)
 
-def process_expiry():
-    users = get_users()
-    if not users:
-        logger.warning("No users found from LDAP.")
-        return []
 
-    conn = get_ldap_connection()
+def load_notification_snapshot() -> DirectorySnapshot:
     now = datetime.now(timezone.utc)
-    notify_list = []
+    with track_phase('directory_fetch'):
+        return get_expiry_candidates_snapshot(*get_notification_window(get_notification_config(), now))
 
-    logger.info(f"Processing {len(users)} users...")
 
-    for user in users:
-        expires_raw = user.get("account_expires_raw")
-        username, email = user.get("username"), user.get("email")
-        first_name, last_name = user.get("first_name"), user.get("last_name")
-        user_dn = get_user_dn(first_name, last_name)
+def plan_notifications(snapshot: DirectorySnapshot, skip: set[tuple[str, str]] = frozenset()) -> NotificationPlan:
+    plan = NotificationPlan()
+    if snapshot.error:
+        logger.warning(f"Directory snapshot failed, nothing planned: {snapshot.error}")
+        return plan
 
-        if not (user_dn and email and expires_raw):
+    now = datetime.now(timezone.utc)
+    # One config snapshot per run, so a reload mid-run can't mix thresholds and templates
+    config = get_notification_config()
+    start, end = get_notification_window(config, now)
+
+    if len(snapshot.expiry_filetimes) != len(snapshot.expiry_index):
+        snapshot.build_indexes()
+    lo, hi = snapshot.expiry_range(start, end)
+    candidates = snapshot.expiry_index[lo:hi]
+    days_left_all, stages = classify_expiry(memoryview(snapshot.expiry_filetimes)[lo:hi], config.stages, now)
+
+    logger.info(
+        f"Processing {len(candidates)} account(s) in the notification window out of "
+        f"{len(snapshot.users)} users with notification config {config.version}..."
+    )
+
+    # The ledger keys state by expiry cycle, so renewals need no cleanup there
+    ledger = load_notified_stages(start, end) if uses_notification_ledger() else None
+
+    # Accounts renewed past the earliest stage, or to "never expires", get their notification tags cleared.
+    # Writes go to the entry's own distinguishedName, wherever in the tree it lives
+    for user in snapshot.info_index if ledger is None else ():
+        if user.dn and user.email and (user.expires_at is None or user.expires_at >= end):
+            plan.info_changes.append(InfoChange(user.dn, user.username))
+
+    for user, days_left, stage in zip(candidates, days_left_all, stages):
+        if user.is_admin or stage is None:
+            continue
+
+        username, email = user.username, user.email
+        first_name, last_name = user.first_name, user.last_name
+        expires = user.expires_at
+
+        if not (email and (user.guid if ledger is not None else user.dn)):
             logger.warning(f"[SKIP] Missing data for user {username}")
             continue
 
-        try:
-            expires = get_expiry_date(expires_raw)
-        except Exception as e:
-            logger.warning(f"Could not parse expiry for {username}: {e}")
+        info = user.info
+        tag = f"notified_{stage}"
+        if ledger is not None:
+            if stage in ledger.get((user.guid, expires), ()):
+                continue
+        elif tag in info:
+            continue
+        if (email, stage) in skip:
+            logger.info(f"[SKIP] {username} '{stage}' is still owned by an unfinished run")
             continue
 
-        days_left = (expires - now).days
         template_context = {
             "email": email, "username": username,
             "first_name": first_name, "last_name": last_name,
@@ -66,119 +110,305 @@ def process_expiry():
             "date": now.date().isoformat()
         }
 
-        info = get_user_info(conn, user_dn, username)
+        notification = {
+            **user.to_dict(),
+            "guid": user.guid,
+            # Set up front so the ledger can match the delivery back to this notification
+            "message_id": make_msgid(domain=DNS_NAME),
+            "days_left": days_left,
+            "stage": stage,
+            **config.templates.messages[stage].render(template_context),
+            "expiry_date": expires.strftime('%d.%m.%Y'),
+            "sent_at": now.strftime('%d.%m.%Y %H:%M'),
+        }
+        if ledger is None:
+            # The tag write is deferred until delivery, so it travels with the notification
+            notification.update({"dn": user.dn, "new_info": f"{info};{tag}" if info else tag, "has_old_info": bool(info)})
+        plan.notifications.append(notification)
 
-        if info and days_left > NOTIFICATION_DAYS["early"]:
-            reset_user_info(conn, user_dn, username)
-            continue
+    return plan
 
-        for start, end, stage in STAGES:
-            tag = f"notified_{stage}"
-            if start >= days_left > end and tag not in info:
-                msg_cfg = MESSAGES.get(stage, {})
-                subject = format_string(msg_cfg.get("subject", ""), template_context)
-                email_content = msg_cfg.get("email_content", {})
-                header = format_string(email_content.get("header", ""), template_context)
-                body = format_string(email_content.get("body", ""), template_context)
-                footer = format_string(email_content.get("footer", ""), template_context)
-
-                notify_list.append({
-                    **user,
-                    "days_left": days_left,
-                    "stage": stage,
-                    "subject": subject,
-                    "header": header,
-                    "body": body,
-                    "footer": footer,
-                    "expiry_date": expires.strftime('%d.%m.%Y'),
-                    "sent_at": now.strftime('%d.%m.%Y %H:%M'),
-                })
-
-                new_info = f"{info};{tag}" if info else tag
-                update_user_info(conn, user_dn, new_info, bool(info), username)
-                break
-
-    conn.unbind()
-    logger.info(f"Finished processing. {len(notify_list)} notifications prepared.")
-    return notify_list
 
+def process_expiry(snapshot: DirectorySnapshot, dry_run=False):
+    with track_phase('plan'):
+        plan = plan_notifications(snapshot, skip=set() if dry_run else in_flight_keys())
 
-def send_email(subject, recipients, html_content, plain_text):
+    if dry_run:
+        logger.info(
+            f"[DRY RUN] {len(plan.notifications)} notifications planned, "
+            f"{len(plan.info_changes)} 'info' resets skipped."
+        )
+        return plan.notifications
+
+    with track_phase('ldap_write'):
+        _, write_operations = apply_info_changes(plan.info_changes)
+    if plan.info_changes:
+        invalidate_directory_snapshot()
+
+    # Journal the plan before anything is sent: from here on every recipient is checkpointed
+    start_run(plan.notifications, snapshot.admin_emails)
+
+    logger.info(
+        f"Finished processing. {len(plan.notifications)} notifications prepared, "
+        f"{snapshot.ldap_operations + write_operations} LDAP operations issued."
+    )
+    return plan.notifications
+
+
+def build_email(subject, recipients, html_content, plain_text):
     if isinstance(recipients, str):
         recipients = [recipients]
 
-    try:
-        email = EmailMultiAlternatives(
-            subject=subject,
-            body=plain_text,
-            from_email=DEFAULT_FROM_EMAIL,
-            to=recipients,
+    email = EmailMultiAlternatives(
+        subject=subject,
+        body=plain_text,
+        from_email=DEFAULT_FROM_EMAIL,
+        to=recipients,
+    )
+    email.attach_alternative(html_content, "text/html")
+    return email
+
+
+def send_emails(emails: list, max_per_second=None, on_result=None) -> list[dict]:
+    # One SMTP session per EMAIL_BATCH_SIZE messages instead of one per message
+    batch_size = getattr(settings, 'EMAIL_BATCH_SIZE', 100)
+    min_interval = 1 / max_per_second if max_per_second else 0
+    next_send_at = time.monotonic()
+    results = []
+
+    for offset in range(0, len(emails), batch_size):
+        connection = get_connection(fail_silently=False)
+        try:
+            for email in emails[offset:offset + batch_size]:
+                delay = next_send_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                next_send_at = max(next_send_at, time.monotonic()) + min_interval
+                results.append(_send_over(connection, email))
+                if on_result:
+                    on_result(len(results) - 1, results[-1])
+        finally:
+            connection.close()
+
+    sent = sum(1 for result in results if result["sent"])
+    logger.info(f"[EMAIL BATCH] {sent} sent, {len(results) - sent} failed")
+    return results
+
+
+def _send_over(connection, email) -> dict:
+    result = {"to": email.to, "sent": False, "error": ""}
+    for attempt in (1, 2):
+        try:
+            # send_messages() on an already opened backend keeps the session alive
+            connection.open()
+            with SMTP_LATENCY.time():
+                connection.send_messages([email])
+            result["sent"] = True
+            result["error"] = ""
+            logger.info(f"[EMAIL SENT] To: {', '.join(email.to)}")
+            break
+        except (smtplib.SMTPServerDisconnected, ConnectionError) as e:
+            # The relay dropped the session: reconnect once and retry this message
+            result["error"] = str(e)
+            connection.close()
+            if attempt == 1:
+                logger.warning(f"[EMAIL RETRY] SMTP connection lost, reconnecting: {e}")
+        except Exception as e:
+            result["error"] = str(e)
+            break
+
+    if not result["sent"]:
+        logger.error(f"[EMAIL ERROR] Failed to send email to {email.to}: {result['error']}")
+    return result
+
+
+def send_email(subject, recipients, html_content, plain_text):
+    return send_emails([build_email(subject, recipients, html_content, plain_text)])[0]
+
+
+def render_notification_email(user: dict):
+    context = {
+        "subject": user["subject"],
+        "user": user,
+        "message": user["body"],
+        "header": user["header"],
+        "footer": user["footer"],
+    }
+
+    html_body = get_notification_config().templates.auto_user_html.render(context)
+    email = build_email(user["subject"], user["email"], html_body, user["body"])
+    if user.get("message_id"):
+        email.extra_headers["Message-ID"] = user["message_id"]
+    return email
+
+
+def deliver_notifications(notifications: list, max_per_second=None) -> list:
+    # Items a previous attempt already got through are not sent again, e.g. when a
+    # Celery retry or a resumed run hands over the same chunk
+    states = item_states(notifications)
+    done = (NotificationRunItem.SENT, NotificationRunItem.ACKNOWLEDGED)
+    pending = []
+    for user in notifications:
+        if states.get(user.get("run_item_id")) in done:
+            user["email_sent"] = True
+        else:
+            pending.append(user)
+    if len(pending) < len(notifications):
+        logger.info(f"[JOURNAL] {len(notifications) - len(pending)} notification(s) already sent, skipping")
+
+    with track_phase('render'):
+        emails = [render_notification_email(user) for user in pending]
+    set_state([user["run_item_id"] for user in pending if user.get("run_item_id")], NotificationRunItem.RENDERED)
+
+    def checkpoint(index, result):
+        # One row per message, so a crash mid-batch loses at most the message in flight
+        item_id = pending[index].get("run_item_id")
+        if item_id:
+            set_state([item_id], NotificationRunItem.SENT if result["sent"] else NotificationRunItem.FAILED, result["error"])
+
+    with track_phase('smtp'):
+        results = send_emails(emails, max_per_second=max_per_second, on_result=checkpoint)
+
+    for user, result in zip(pending, results):
+        user["email_sent"] = result["sent"]
+        EMAILS.labels(user["stage"], "sent" if result["sent"] else "failed").inc()
+
+    acknowledge_notifications(notifications)
+    return notifications
+
+
+def acknowledge_notifications(notifications: list) -> int:
+    # Record the sent stages where the next run looks for them. Failed sends get no
+    # record at all and are simply planned again
+    states = item_states(notifications)
+    sent = [
+        user for user in notifications
+        if user.get("email_sent") and states.get(user.get("run_item_id")) != NotificationRunItem.ACKNOWLEDGED
+    ]
+    if not sent:
+        return 0
+
+    if uses_notification_ledger():
+        with track_phase('ledger_write'):
+            record_sent(sent)
+        acknowledged = sent
+    else:
+        changes = [
+            InfoChange(user["dn"], user["username"], user["new_info"], user["has_old_info"])
+            for user in sent if user.get("dn")
+        ]
+        with track_phase('ldap_write'):
+            results, _ = apply_info_changes(changes)
+        if changes:
+            invalidate_directory_snapshot()
+        applied = {result["dn"] for result in results if result["applied"]}
+        acknowledged = [user for user in sent if user.get("dn") in applied]
+
+    set_state([user["run_item_id"] for user in acknowledged if user.get("run_item_id")], NotificationRunItem.ACKNOWLEDGED)
+    return len(acknowledged)
+
+
+def claim_stale_runs() -> list[tuple[int, list[dict], bool]]:
+    # (run id, unsettled notifications, whether the admin report is still owed) per interrupted run
+    claimed = []
+    for run in stale_runs():
+        if not claim_run(run):
+            continue
+        open_items = run_notifications(
+            run, states=(NotificationRunItem.PLANNED, NotificationRunItem.RENDERED, NotificationRunItem.SENT)
         )
-        email.attach_alternative(html_content, "text/html")
-        email.send()
-        logger.info(f"[EMAIL SENT] To: {', '.join(recipients)}")
-    except Exception as e:
-        logger.error(f"[EMAIL ERROR] Failed to send email to {recipients}: {e}")
+        logger.info(f"[JOURNAL] Resuming run {run.pk}: {len(open_items)} unsettled notification(s)")
+        # The admin report is only owed if the interrupted run never got to send it
+        report_owed = any(not user["email_sent"] for user in open_items)
+        claimed.append((run.pk, open_items, report_owed))
+    return claimed
+
+
+def finish_resumed_run(run_id, report_owed):
+    run = NotificationRun.objects.filter(pk=run_id).first()
+    if run is None:
+        return
+    if report_owed:
+        send_admin_report(run_notifications(run), run.admin_emails)
+    complete_run(run_id)
 
 
+def resume_notification_runs() -> int:
+    # Finish what interrupted runs left behind before planning anything new
+    claimed = claim_stale_runs()
+    for run_id, open_items, report_owed in claimed:
+        deliver_notifications(open_items, max_per_second=getattr(settings, 'EMAIL_MAX_PER_SECOND', 0))
+        finish_resumed_run(run_id, report_owed)
+    return len(claimed)
 
-def send_notification():
+
+def send_notification(snapshot: DirectorySnapshot | None = None, dry_run=False):
     logger.info("[START] Sending user notifications...")
-    users_to_notify = process_expiry()
-    logger.info(f"[INFO] {len(users_to_notify)} user(s) to notify")
-
-    for user in users_to_notify:
-        context = {
-            "subject": user["subject"],
-            "user": user,
-            "message": user["body"],
-            "header": user["header"],
-            "footer": user["footer"],
-        }
+    with track_phase('run'):
+        if not dry_run:
+            resume_notification_runs()
+        if snapshot is None:
+            snapshot = load_notification_snapshot()
+        users_to_notify = process_expiry(snapshot, dry_run=dry_run)
+        logger.info(f"[INFO] {len(users_to_notify)} user(s) to notify")
+
+        if dry_run:
+            logger.info("[DRY RUN] Skipping email delivery and admin report")
+            return users_to_notify
+
+        deliver_notifications(users_to_notify, max_per_second=getattr(settings, 'EMAIL_MAX_PER_SECOND', 0))
+
+        logger.info("[COMPLETE] Finished sending user notifications")
+        send_admin_report(users_to_notify, snapshot.admin_emails)
+        if users_to_notify:
+            complete_run(users_to_notify[0].get("run_id"))
 
-        html_body = render_to_string("emails/auto_user_notification.html", context)
-        send_email(user["subject"], user["email"], html_body, user["body"])
+    LAST_RUN.set_to_current_time()
+    return users_to_notify
 
-    logger.info("[COMPLETE] Finished sending user notifications")
-    send_admin_report(users_to_notify)
 
+def split_into_chunks(items: list, chunks: int) -> list[list]:
+    chunks = max(1, min(chunks, len(items)))
+    size, remainder = divmod(len(items), chunks)
+    result, start = [], 0
+    for index in range(chunks):
+        end = start + size + (1 if index < remainder else 0)
+        result.append(items[start:end])
+        start = end
+    return [chunk for chunk in result if chunk]
 
-def send_admin_report(users: list):
+
+def send_admin_report(users: list, admin_emails: list[str]):
+    with track_phase('admin_report'):
+        _send_admin_report(users, admin_emails)
+
+
+def _send_admin_report(users: list, admin_emails: list[str]):
     logger.info("[ADMIN REPORT] Preparing admin report...")
     now = datetime.now(timezone.utc)
-    config_section = config.get("admin_auto_report", {})
-
-    subject = format_string(config_section.get("subject", ""), {
+    templates = get_notification_config().templates
+    report = templates.admin_report.render({
         "date": now.date().isoformat(),
         "total_users": len(users),
     })
 
-    email_content = config_section.get("email_content", {})
+    subject = report.pop("subject")
     context = {
         "subject": subject,
         "notification_date": now.strftime('%d.%m.%Y %H:%M'),
         "total_users": len(users),
         "now": now,
         "user_table": generate_user_table(users),
-        "email_content": {
-            "header": format_string(email_content.get("header", ""), {
-                "total_users": len(users), "date": now.date().isoformat()
-            }),
-            "body": format_string(email_content.get("body", ""), {
-                "total_users": len(users)
-            }),
-            "footer": format_string(email_content.get("footer", ""), {
-                "date": now.date().isoformat()
-            }),
-        }
+        "email_content": report,
     }
 
-    html = render_to_string("emails/admin_auto_report.html", context)
-    to = [admin["email"] for admin in get_admin_users() if admin.get("email")]
+    html = templates.admin_report_html.render(context)
+    to = admin_emails
 
     if not to:
         logger.warning("[ADMIN REPORT] No admin emails found in LDAP")
         return
 
-    send_email(subject, to, html, strip_tags(html))
+    result = send_email(subject, to, html, strip_tags(html))
+    EMAILS.labels("admin_report", "sent" if result["sent"] else "failed").inc()
     logger.info(f"[ADMIN REPORT SENT] To: {', '.join(to)} | Users in report: {len(users)}")
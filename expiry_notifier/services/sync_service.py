@@ -0,0 +1,114 @@
+import logging
+from datetime import datetime, timedelta, timezone
+from django.conf import settings
+from django.db.models import Q
+from ldap3 import core
+from expiry_notifier.ldap.ldap_connector import ldap_connection
+from expiry_notifier.models import DirectorySyncState, DirectoryUserRecord
+from expiry_notifier.services.cache_service import invalidate_directory_snapshot
+from expiry_notifier.services.directory import DirectorySnapshot
+from expiry_notifier.services.ldap_service import iter_ldap_user_pages
+
+logger = logging.getLogger(__name__)
+
+SHOW_DELETED_CONTROL = '1.2.840.113556.1.4.417'
+
+MIRROR_FIELDS = [
+    'dn', 'username', 'email', 'name', 'first_name', 'last_name', 'expires_at',
+    'disabled', 'is_admin', 'info', 'usn_changed', 'synced_at',
+]
+
+
+def get_sync_filter(min_usn=0):
+    # Disabled accounts are mirrored too, so a user being disabled shows up as a change
+    usn_filter = f'(uSNChanged>={min_usn})' if min_usn else ''
+    return f'(&(objectCategory=person)(objectClass=user){usn_filter})'
+
+
+def get_deleted_filter(min_usn):
+    return f'(&(isDeleted=TRUE)(objectClass=user)(uSNChanged>={min_usn}))'
+
+
+def sync_directory(full=False) -> dict:
+    now = datetime.now(timezone.utc)
+    state, _ = DirectorySyncState.objects.get_or_create(pk=1, defaults={'server': ''})
+    full_sync_interval = timedelta(seconds=getattr(settings, 'DIRECTORY_FULL_SYNC_INTERVAL', 24 * 60 * 60))
+    upserted = deleted = 0
+
+    with ldap_connection(pinned=True) as conn:
+        # uSNChanged is local to one DC, so failing over to another invalidates the high-water mark
+        server = conn.server.name
+        full = (
+            full
+            or not state.highest_usn
+            or state.server != server
+            or not state.last_full_sync_at
+            or now - state.last_full_sync_at > full_sync_interval
+        )
+        min_usn = 0 if full else state.highest_usn + 1
+        highest_usn = state.highest_usn
+
+        for page in iter_ldap_user_pages(conn, get_sync_filter(min_usn)):
+            records = [DirectoryUserRecord.from_directory_user(user, now) for user in page if user.guid]
+            DirectoryUserRecord.objects.bulk_create(
+                records,
+                update_conflicts=True,
+                unique_fields=['guid'],
+                update_fields=MIRROR_FIELDS,
+            )
+            upserted += len(records)
+            highest_usn = max([highest_usn, *(user.usn_changed for user in page)])
+
+        if full:
+            # Anything not touched by a full pass no longer exists in the directory
+            deleted, _ = DirectoryUserRecord.objects.filter(synced_at__lt=now).delete()
+        else:
+            try:
+                for page in iter_ldap_user_pages(
+                    conn,
+                    get_deleted_filter(min_usn),
+                    search_base=f'CN=Deleted Objects,{settings.AUTH_LDAP_BASE_DN}',
+                    controls=[(SHOW_DELETED_CONTROL, True, None)],
+                ):
+                    guids = [user.guid for user in page if user.guid]
+                    deleted += DirectoryUserRecord.objects.filter(guid__in=guids).delete()[0]
+                    highest_usn = max([highest_usn, *(user.usn_changed for user in page)])
+            except core.exceptions.LDAPException as e:
+                logger.warning(f"[SYNC] Could not read deleted objects, relying on the next full sync: {e}")
+
+    state.server = server
+    state.highest_usn = highest_usn
+    state.last_sync_at = now
+    if full:
+        state.last_full_sync_at = now
+    state.save()
+
+    if upserted or deleted:
+        invalidate_directory_snapshot()
+
+    logger.info(
+        f"[SYNC] {'Full' if full else 'Delta'} directory sync: {upserted} upserted, "
+        f"{deleted} deleted, high-water uSNChanged {highest_usn}"
+    )
+    return {'full': full, 'upserted': upserted, 'deleted': deleted, 'highest_usn': highest_usn}
+
+
+def mirror_directory_snapshot(expiring_from=None, expiring_before=None) -> DirectorySnapshot:
+    current_time = datetime.now(timezone.utc)
+    snapshot = DirectorySnapshot()
+
+    records = DirectoryUserRecord.objects.filter(disabled=False)
+    if expiring_before:
+        # Same candidate set as the LDAP expiry filter, answered from the expires_at index
+        window = Q(expires_at__lt=expiring_before, expires_at__isnull=False)
+        if expiring_from:
+            window &= Q(expires_at__gte=expiring_from)
+        renewed = ~Q(info='') & (Q(expires_at__gte=expiring_before) | Q(expires_at__isnull=True))
+        records = records.exclude(email='').filter(window | renewed | Q(is_admin=True))
+
+    for record in records.iterator(chunk_size=2000):
+        user = record.to_directory_user(current_time)
+        (snapshot.admins if user.is_admin else snapshot.users).append(user)
+
+    snapshot.build_indexes()
+    return snapshot
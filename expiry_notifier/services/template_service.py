@@ -0,0 +1,115 @@
+import string
+from dataclasses import dataclass
+from django.core.exceptions import ImproperlyConfigured
+from django.template.loader import get_template
+
+AUTO_USER_TEMPLATE = 'emails/auto_user_notification.html'
+MANUAL_USER_TEMPLATE = 'emails/manual_user_notification.html'
+ADMIN_REPORT_TEMPLATE = 'emails/admin_auto_report.html'
+
+# Placeholders each config section may use; anything else is rejected when the registry is built
+STAGE_PLACEHOLDERS = frozenset({
+    'email', 'username', 'first_name', 'last_name', 'days', 'expired_days',
+    'days_overdue', 'year', 'date',
+})
+MANUAL_PLACEHOLDERS = frozenset({'username', 'expired_days', 'days_overdue', 'expiry_date', 'current_date'})
+ADMIN_REPORT_PLACEHOLDERS = frozenset({'date', 'total_users'})
+
+_formatter = string.Formatter()
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledText:
+    template: str
+    fields: frozenset
+
+    @classmethod
+    def compile(cls, template, allowed, where):
+        try:
+            fields = frozenset(
+                # "user.name" / "items[0]" only need the root name in the context
+                field_name.split('.', 1)[0].split('[', 1)[0]
+                for _, field_name, _, _ in _formatter.parse(template)
+                if field_name is not None
+            )
+        except ValueError as e:
+            raise ImproperlyConfigured(f"Malformed template in {where}: {e}") from e
+
+        unknown = fields - allowed
+        if unknown:
+            raise ImproperlyConfigured(
+                f"Unknown placeholder(s) {sorted(unknown)} in {where}; "
+                f"allowed: {sorted(allowed)}"
+            )
+        if not fields:
+            # Rendered as-is below, so resolve the {{ / }} escapes now like format_map would
+            template = template.format_map({})
+        return cls(template, fields)
+
+    def render(self, context: dict) -> str:
+        if not self.fields:
+            return self.template
+        return self.template.format_map(context)
+
+
+@dataclass(frozen=True, slots=True)
+class CompiledMessage:
+    subject: CompiledText
+    header: CompiledText
+    body: CompiledText
+    footer: CompiledText
+    urgency_level: str = ''
+    message_type: str = ''
+    days: int | None = None
+
+    @classmethod
+    def compile(cls, section: dict, allowed, where):
+        content = section.get('email_content', {})
+        return cls(
+            subject=CompiledText.compile(section.get('subject', ''), allowed, f'{where}.subject'),
+            header=CompiledText.compile(content.get('header', ''), allowed, f'{where}.email_content.header'),
+            body=CompiledText.compile(content.get('body', ''), allowed, f'{where}.email_content.body'),
+            footer=CompiledText.compile(content.get('footer', ''), allowed, f'{where}.email_content.footer'),
+            urgency_level=section.get('urgency_level', ''),
+            message_type=section.get('message_type', ''),
+            days=section.get('days'),
+        )
+
+    def render(self, context: dict) -> dict:
+        return {
+            'subject': self.subject.render(context),
+            'header': self.header.render(context),
+            'body': self.body.render(context),
+            'footer': self.footer.render(context),
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class NotificationTemplates:
+    messages: dict
+    manual: dict
+    admin_report: CompiledMessage
+    auto_user_html: object
+    manual_user_html: object
+    admin_report_html: object
+
+    @classmethod
+    def from_config(cls, config: dict):
+        return cls(
+            messages={
+                stage: CompiledMessage.compile(section, STAGE_PLACEHOLDERS, f'messages.{stage}')
+                for stage, section in config.get('messages', {}).items()
+            },
+            manual={
+                kind: CompiledMessage.compile(section, MANUAL_PLACEHOLDERS, f'manual_notification_settings.{kind}')
+                for kind, section in config.get('manual_notification_settings', {}).items()
+            },
+            admin_report=CompiledMessage.compile(
+                config.get('admin_auto_report', {}), ADMIN_REPORT_PLACEHOLDERS, 'admin_auto_report'
+            ),
+            # Parsed once here; rendering afterwards only merges the per-user context
+            auto_user_html=get_template(AUTO_USER_TEMPLATE),
+            manual_user_html=get_template(MANUAL_USER_TEMPLATE),
+            admin_report_html=get_template(ADMIN_REPORT_TEMPLATE),
+        )
+
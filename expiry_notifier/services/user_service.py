@@ -1,16 +1,112 @@
-import json
-from .ldap_service import ldap_users
-
-def get_admin_users():
-    response = ldap_users()
-    admin_users_json = json.loads(response.content)
-    return admin_users_json.get('admin_users', [])
-
-def get_users():
-    response = ldap_users()
-    users_json = json.loads(response.content)
-    return users_json.get('users', [])
-
-def get_expired_users():
-    users = get_users()
-    return [user for user in users if user.get('expired')]
+from datetime import datetime, timezone
+from django.conf import settings
+from .cache_service import get_cached_snapshot, peek_cached_snapshot
+from .directory import DirectorySnapshot, DirectoryUser
+from expiry_notifier.ldap.query_builder import present
+from .ledger_service import uses_notification_ledger
+from .ldap_service import (
+    LEDGER_NOTIFICATION_ATTRIBUTES, NOTIFICATION_ATTRIBUTES, get_admin_filter, get_expiry_candidates_filter,
+    ldap_directory_snapshot, ldap_find_user_by_email,
+)
+
+# Disabled accounts are excluded from every snapshot, so there is no filter for them
+STATUS_FILTERS = ('all', 'expired', 'admin')
+SORT_OPTIONS = ('expiry', '-expiry')
+
+
+def uses_directory_mirror():
+    return getattr(settings, 'DIRECTORY_SOURCE', 'ldap') == 'mirror'
+
+
+def load_directory_snapshot(fresh=False) -> DirectorySnapshot:
+    if uses_directory_mirror():
+        from .sync_service import mirror_directory_snapshot, sync_directory
+        if fresh:
+            sync_directory()
+        return mirror_directory_snapshot()
+    return ldap_directory_snapshot()
+
+
+def get_directory_snapshot(use_cache=True) -> DirectorySnapshot:
+    if use_cache:
+        return get_cached_snapshot(load_directory_snapshot)
+    return load_directory_snapshot(fresh=True)
+
+
+def get_expiry_candidates_snapshot(start: datetime | None, end: datetime) -> DirectorySnapshot:
+    # Uncached partial snapshot for the notification run: only accounts the run can act on
+    if uses_directory_mirror():
+        from .sync_service import mirror_directory_snapshot, sync_directory
+        sync_directory()
+        return mirror_directory_snapshot(expiring_from=start, expiring_before=end)
+    if uses_notification_ledger():
+        # State lives in the database: no tags to clear, nothing written back to AD
+        return ldap_directory_snapshot(
+            search_filter=get_expiry_candidates_filter(start, end, renewed_tags=False),
+            admin_filter=get_admin_filter(present('mail')),
+            attributes=LEDGER_NOTIFICATION_ATTRIBUTES,
+        )
+    return ldap_directory_snapshot(
+        search_filter=get_expiry_candidates_filter(start, end),
+        # Admins only matter as report recipients
+        admin_filter=get_admin_filter(present('mail')),
+        attributes=NOTIFICATION_ATTRIBUTES,
+        # Tags are read from the DC they are written to, so replication lag can't cause repeats
+        pinned=True,
+    )
+
+
+def get_admin_users() -> list[DirectoryUser]:
+    return get_directory_snapshot().admins
+
+
+def get_users() -> list[DirectoryUser]:
+    return get_directory_snapshot().users
+
+
+def find_user_by_email(email) -> DirectoryUser | None:
+    if uses_directory_mirror():
+        from expiry_notifier.models import DirectoryUserRecord
+        record = DirectoryUserRecord.objects.filter(email__iexact=email, disabled=False).first()
+        return record.to_directory_user(datetime.now(timezone.utc)) if record else None
+
+    # A warm snapshot answers most lookups; a miss may just be an account created since it was taken
+    snapshot = peek_cached_snapshot()
+    if snapshot is not None:
+        user = snapshot.by_email.get(email.lower())
+        if user is not None:
+            return user
+
+    return ldap_find_user_by_email(email)
+
+
+def get_expired_users() -> list[DirectoryUser]:
+    return [user for user in get_users() if user.expired]
+
+
+def query_users(snapshot: DirectorySnapshot, status='all', expires_window=None, search='', sort='') -> list[DirectoryUser]:
+    # Narrow the candidates through the expiry index first, then apply the cheap predicates
+    if expires_window:
+        candidates = snapshot.expiring_between(*expires_window)
+    elif status == 'expired':
+        candidates = snapshot.expiring_between(end=datetime.now(timezone.utc))
+    elif sort in SORT_OPTIONS:
+        candidates = snapshot.expiry_index + [
+            user for user in snapshot.users + snapshot.admins if not user.expires_at
+        ]
+    else:
+        candidates = snapshot.admins if status == 'admin' else snapshot.users
+
+    want_admins = status == 'admin'
+    search = search.strip().lower()
+
+    users = [
+        user for user in candidates
+        if user.is_admin == want_admins
+        and (status != 'expired' or user.expired)
+        and (not search or search in user.username.lower() or search in user.email.lower())
+    ]
+
+    if sort == '-expiry':
+        users.reverse()
+    return users
@@ -1,11 +1,98 @@
 import logging
-from celery import shared_task
+import time
+from celery import chord, group, shared_task
+from celery.signals import task_postrun
+from django.conf import settings
 
-from expiry_notifier.services.notification_service import send_notification
+from expiry_notifier.metrics import LAST_RUN, PHASE_DURATION, push_metrics
+from expiry_notifier.services.manual_service import send_bulk_notifications
+from expiry_notifier.services.journal_service import complete_run
+from expiry_notifier.services.notification_service import (
+    claim_stale_runs, deliver_notifications, finish_resumed_run, load_notification_snapshot, process_expiry,
+    send_admin_report, split_into_chunks,
+)
+from expiry_notifier.services.sync_service import sync_directory
 
 logger = logging.getLogger(__name__)
 
 
+@task_postrun.connect
+def push_task_metrics(**kwargs):
+    # Worker processes are not scraped, so hand their counters to the Pushgateway after each task
+    push_metrics()
+
+
+def finish_run(started_at):
+    PHASE_DURATION.labels('run').observe(time.time() - started_at)
+    LAST_RUN.set_to_current_time()
+
+
 @shared_task
 def send_daily_notification():
-    send_notification()
\ No newline at end of file
+    started_at = time.time()
+    # Interrupted runs are claimed first, so the new plan leaves their recipients to them
+    resumed = claim_stale_runs()
+    snapshot = load_notification_snapshot()
+    notifications = process_expiry(snapshot)
+
+    concurrency = getattr(settings, 'EMAIL_DISPATCH_CONCURRENCY', 4)
+    resumed_chunks = [
+        (run_id, split_into_chunks(open_items, concurrency), report_owed)
+        for run_id, open_items, report_owed in resumed
+    ]
+    chunks = split_into_chunks(notifications, concurrency)
+
+    # The global messages-per-second cap is shared evenly between all parallel chunks, resumed ones included
+    max_per_second = getattr(settings, 'EMAIL_MAX_PER_SECOND', 0)
+    total_chunks = len(chunks) + sum(len(run_chunks) for _, run_chunks, _ in resumed_chunks)
+    chunk_rate = max_per_second / total_chunks if max_per_second and total_chunks else 0
+
+    for run_id, run_chunks, report_owed in resumed_chunks:
+        if not run_chunks:
+            finish_resumed_run(run_id, report_owed)
+            continue
+        logger.info(f"[DISPATCH] Resumed run {run_id} split into {len(run_chunks)} chunk(s)")
+        chord(
+            group(send_notification_chunk.s(chunk, chunk_rate) for chunk in run_chunks)
+        )(finish_resumed_run_task.s(run_id, report_owed))
+
+    if not chunks:
+        send_admin_report([], snapshot.admin_emails)
+        finish_run(started_at)
+        return
+
+    logger.info(f"[DISPATCH] {len(notifications)} notification(s) split into {len(chunks)} chunk(s)")
+    chord(
+        group(send_notification_chunk.s(chunk, chunk_rate) for chunk in chunks)
+    )(send_admin_report_task.s(snapshot.admin_emails, started_at, notifications[0].get('run_id')))
+
+
+# Every recipient is checkpointed in the run journal, so a retried chunk skips what already went out
+@shared_task(autoretry_for=(Exception,), retry_backoff=True, max_retries=3)
+def send_notification_chunk(notifications, max_per_second=0):
+    return deliver_notifications(notifications, max_per_second=max_per_second)
+
+
+@shared_task
+def send_admin_report_task(chunk_results, admin_emails, started_at=None, run_id=None):
+    notifications = [user for chunk in chunk_results for user in chunk]
+    send_admin_report(notifications, admin_emails)
+    complete_run(run_id)
+    if started_at:
+        # Wall time across the whole chord, measured from when the daily task started
+        finish_run(started_at)
+
+
+@shared_task
+def finish_resumed_run_task(chunk_results, run_id, report_owed):
+    finish_resumed_run(run_id, report_owed)
+
+
+@shared_task
+def sync_directory_mirror(full=False):
+    return sync_directory(full=full)
+
+
+@shared_task
+def send_bulk_notification_task(batch_id, recipients):
+    return send_bulk_notifications(batch_id, recipients)
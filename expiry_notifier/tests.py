@@ -0,0 +1,34 @@
+from datetime import datetime, timedelta, timezone
+from django.test import SimpleTestCase, override_settings
+from expiry_notifier.services.directory import DirectorySnapshot, DirectoryUser
+from expiry_notifier.services.ldap_service import get_expiry_candidates_filter
+from expiry_notifier.services.notification_service import plan_notifications
+from expiry_notifier.utils.time_util import NEVER_EXPIRES
+
+
+@override_settings(NOTIFICATION_STATE_BACKEND='ldap')
+class RenewedTagResetTests(SimpleTestCase):
+    def tagged_user(self, username, expires_at):
+        return DirectoryUser(
+            name=username, email=f'{username}@example.com', username=username,
+            dn=f'CN={username},DC=example,DC=com', info='notified_early', expires_at=expires_at,
+        )
+
+    def test_never_expiring_tagged_account_is_reset(self):
+        now = datetime.now(timezone.utc)
+        snapshot = DirectorySnapshot(users=[
+            self.tagged_user('renewed', now + timedelta(days=365)),
+            self.tagged_user('never', None),
+        ])
+        snapshot.build_indexes()
+
+        plan = plan_notifications(snapshot)
+
+        self.assertEqual({change.username for change in plan.info_changes}, {'renewed', 'never'})
+        self.assertTrue(all(change.is_reset for change in plan.info_changes))
+
+    def test_candidates_filter_fetches_never_expiring_tagged_accounts(self):
+        search_filter = get_expiry_candidates_filter(None, datetime.now(timezone.utc))
+
+        self.assertIn('(accountExpires=0)', search_filter)
+        self.assertIn(f'(accountExpires={NEVER_EXPIRES})', search_filter)
@@ -1,10 +1,22 @@
+from django.conf import settings
 from django.urls import path
-from expiry_notifier.views import main_views, email_views, auth_views
+from expiry_notifier.views import main_views, email_views, auth_views, metrics_views
+
+# Under ASGI the sync views would all be funnelled through one thread, so the async variants are routed instead
+if getattr(settings, 'SERVE_ASYNC', False):
+    main_page, send_email_view = main_views.main_page_async, email_views.send_email_view_async
+    bulk_send_view, bulk_progress_view = email_views.bulk_send_view_async, email_views.bulk_progress_view_async
+else:
+    main_page, send_email_view = main_views.main_page, email_views.send_email_view
+    bulk_send_view, bulk_progress_view = email_views.bulk_send_view, email_views.bulk_progress_view
 
 urlpatterns = [
-    path('', main_views.main_page, name='main_page'),
+    path('', main_page, name='main_page'),
     path('login/', auth_views.ldap_login, name='login'),
     path('logout/', auth_views.ldap_logout, name='logout'),
-    path("send-email/<str:email>/", email_views.send_email_view, name="send_email"),
+    path("send-email/<str:email>/", send_email_view, name="send_email"),
+    path("bulk-send/", bulk_send_view, name="bulk_send"),
+    path("bulk-send/<str:batch_id>/", bulk_progress_view, name="bulk_send_progress"),
+    path('metrics', metrics_views.metrics_view, name='metrics'),
 
 ]
@@ -0,0 +1,46 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.db import close_old_connections
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_blocking_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'ASYNC_BLOCKING_WORKERS', 8),
+                thread_name_prefix='blocking-io',
+            )
+        return _executor
+
+
+def _call_and_release(func, args, kwargs):
+    try:
+        return func(*args, **kwargs)
+    finally:
+        # Executor threads are long-lived; don't let them hold DB connections between calls
+        close_old_connections()
+
+
+async def run_blocking(func, *args, **kwargs):
+    # LDAP, SMTP, cache and ORM calls run on a bounded pool, so a slow DC ties up
+    # one of its threads instead of the event loop or a whole worker process
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_blocking_executor(), partial(_call_and_release, func, args, kwargs))
+
+
+def async_login_required(view):
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        # Resolving request.user loads the session, which is a blocking DB/cache read
+        if not await run_blocking(lambda: request.user.is_authenticated):
+            return redirect_to_login(request.get_full_path())
+        return await view(request, *args, **kwargs)
+    return wrapper
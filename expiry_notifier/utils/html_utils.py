@@ -1,7 +1,3 @@
-def format_string(template: str, context: dict) -> str:
-    return template.format(**context)
-
-
 def generate_user_table(users: list) -> str:
     if not users:
         return "<p>No users were notified.</p>"
@@ -15,7 +11,7 @@ def generate_user_table(users: list) -> str:
             <td>{user.get('days_left')}</td>
             <td>{user.get('stage')}</td>
             <td>{user.get('expiry_date')}</td>
-            <td>{user.get('sent_at')}</td>
+            <td>{user.get('sent_at') if user.get('email_sent', True) else 'failed'}</td>
         </tr>
         """ for idx, user in enumerate(users, 1)
     ]
@@ -1,8 +1,15 @@
 import logging
-import os
-from ldap import MOD_REPLACE, MOD_ADD, MOD_DELETE
-from expiry_notifier.ldap.ldap_connector import get_ldap_connection
-from expiry_notifier.services.user_service import get_users
+import time
+from collections import deque
+from dataclasses import dataclass
+from django.conf import settings
+from ldap import MOD_REPLACE, MOD_ADD
+from ldap3 import ASYNC, core
+from expiry_notifier.ldap.ldap_connector import close_connection, get_ldap_connection, get_operation_count
+from expiry_notifier.ldap.query_builder import present
+from expiry_notifier.metrics import LDAP_LATENCY, LDAP_OPERATIONS
+from expiry_notifier.services.cache_service import invalidate_directory_snapshot
+from expiry_notifier.services.ldap_service import get_users_filter, ldap_directory_snapshot
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,59 +18,97 @@ logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
 
-def reset_all_user_info():
-    conn = get_ldap_connection()
-    users = get_users()
-
-    for user in users:
-        username = user.get("username", "unknown")
-        first_name = user.get("first_name")
-        last_name = user.get("last_name")
+@dataclass(slots=True)
+class InfoChange:
+    dn: str
+    username: str
+    info: str = ''
+    has_old_info: bool = False
 
-        if not first_name or not last_name:
-            print(f"[SKIP] Missing first_name or last_name for user {username}")
-            continue
+    @property
+    def is_reset(self):
+        return not self.info
 
-        user_dn = f"CN={first_name} {last_name},CN=Users,DC=example,DC=com"
-        print(f"[INFO] Attempting to clear info for: {user_dn}")
+    def modification(self):
+        if self.is_reset:
+            return {"info": [(MOD_REPLACE, [""])]}
+        action = MOD_REPLACE if self.has_old_info else MOD_ADD
+        return {"info": [(action, [self.info])]}
 
-        try:
-            conn.modify(user_dn, {"info": [(MOD_DELETE, [])]})
-            print(f"[RESET] Deleted 'info' for {username}")
-        except Exception as e:
-            print(f"[ERROR] Failed to delete 'info' for {username}: {e}")
-
-    conn.unbind()
 
+def reset_all_user_info():
+    # Only entries that actually carry notification tags need a write
+    snapshot = ldap_directory_snapshot(
+        search_filter=get_users_filter(present('info')), attributes=['sAMAccountName', 'info'], pinned=True
+    )
+    changes = []
+    for user in snapshot.info_index:
+        if not user.dn:
+            print(f"[SKIP] Missing distinguishedName for user {user.username or 'unknown'}")
+            continue
+        changes.append(InfoChange(user.dn, user.username or "unknown"))
 
-def get_user_info(conn, user_dn, username):
-    try:
-        conn.search(user_dn, "(objectClass=*)", attributes=["info"])
-        entry = conn.entries[0] if conn.entries else None
-        return str(entry.info.value) if entry and hasattr(entry, "info") and entry.info.value else ""
-    except Exception as e:
-        logger.warning(f"Could not read 'info' for {username}: {e}")
-        return ""
+    results, _ = apply_info_changes(changes)
+    for result in results:
+        if result["applied"]:
+            print(f"[RESET] Deleted 'info' for {result['username']}")
+        else:
+            print(f"[ERROR] Failed to delete 'info' for {result['username']}: {result['error']}")
 
+    if changes:
+        invalidate_directory_snapshot()
 
-def get_user_dn(first_name, last_name):
-    base_dn = os.getenv("AUTH_LDAP_BASE_DN")
-    return f"CN={first_name} {last_name},CN=Users,{base_dn}"
 
+def apply_info_changes(changes: list[InfoChange], concurrency=None) -> tuple[list[dict], int]:
+    # Pipeline the modify requests over one asynchronous connection, keeping at most
+    # `concurrency` of them outstanding, instead of waiting for each reply in turn
+    if not changes:
+        return [], 0
 
+    concurrency = concurrency or getattr(settings, 'LDAP_WRITE_CONCURRENCY', 16)
+    results = []
+    in_flight = deque()
+    conn = get_ldap_connection(client_strategy=ASYNC, pinned=True)
 
-def update_user_info(conn, user_dn, new_info, has_old_info, username):
-    action = MOD_REPLACE if has_old_info else MOD_ADD
     try:
-        conn.modify(user_dn, {"info": [(action, [new_info])]})
-        logger.info(f"[INFO] {username} marked as '{new_info}' in LDAP")
-    except Exception as e:
-        logger.error(f"Failed to update 'info' for {username}: {e}")
-
-
-def reset_user_info(conn, user_dn, username):
+        for change in changes:
+            if len(in_flight) >= concurrency:
+                results.append(_collect_info_change(conn, *in_flight.popleft()))
+            try:
+                in_flight.append((conn.modify(change.dn, change.modification()), change, time.perf_counter()))
+            except core.exceptions.LDAPException as e:
+                results.append(_info_change_result(change, False, str(e)))
+
+        while in_flight:
+            results.append(_collect_info_change(conn, *in_flight.popleft()))
+    finally:
+        operations = get_operation_count(conn)
+        close_connection(conn)
+
+    applied = sum(1 for result in results if result["applied"])
+    logger.info(f"[LDAP WRITE] {applied} 'info' update(s) applied, {len(results) - applied} failed")
+    return results, operations
+
+
+def _collect_info_change(conn, message_id, change, sent_at):
     try:
-        conn.modify(user_dn, {"info": [(MOD_REPLACE, [""])]})
-        logger.info(f"[RESET] Cleared 'info' for {username} due to password reset")
-    except Exception as e:
-        logger.error(f"Failed to clear 'info' for {username}: {e}")
\ No newline at end of file
+        _, result = conn.get_response(message_id)
+        if result.get("result") == 0:
+            return _info_change_result(change, True)
+        return _info_change_result(change, False, result.get("message") or result.get("description", ""))
+    except core.exceptions.LDAPException as e:
+        return _info_change_result(change, False, str(e))
+    finally:
+        # Pipelined, so this includes the time the request waited behind earlier ones
+        LDAP_LATENCY.labels('modify').observe(time.perf_counter() - sent_at)
+
+
+def _info_change_result(change, applied, error=""):
+    LDAP_OPERATIONS.labels('modify', 'success' if applied else 'error').inc()
+    if applied and change.is_reset:
+        logger.info(f"[RESET] Cleared 'info' for {change.username} due to password reset")
+    elif applied:
+        logger.info(f"[INFO] {change.username} marked as '{change.info}' in LDAP")
+    else:
+        logger.error(f"Failed to update 'info' for {change.username}: {error}")
+    return {"dn": change.dn, "username": change.username, "info": change.info, "applied": applied, "error": error}
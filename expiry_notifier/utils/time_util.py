@@ -32,4 +32,39 @@ def get_expiry_date(expires_raw):
     elif isinstance(expires_raw, (int, float)):
         seconds = expires_raw / 10_000_000 - 11644473600
         return datetime.fromtimestamp(seconds, tz=timezone.utc)
-    raise ValueError("Unsupported expiry format")
\ No newline at end of file
+    raise ValueError("Unsupported expiry format")
+
+
+NEVER_EXPIRES = 9223372036854775807
+
+
+def parse_account_expires(value) -> datetime | None:
+    if value in (None, '', 0, NEVER_EXPIRES):
+        return None
+    if isinstance(value, str) and value.lstrip('-').isdigit():
+        value = int(value)
+    if isinstance(value, int) and (value <= 0 or value == NEVER_EXPIRES):
+        return None
+
+    expires = get_expiry_date(value)
+    # ldap3 formats 0 as 1601-01-01 and the never-expires sentinel as year 9999
+    if expires.year in (1601, 9999):
+        return None
+    return expires if expires.tzinfo else expires.replace(tzinfo=timezone.utc)
+
+
+def days_left_window(start_days, end_days, now: datetime) -> tuple[datetime | None, datetime]:
+    # Expiry range for which start_days >= (expires - now).days > end_days
+    lower = None if end_days == float("-inf") else now + timedelta(days=end_days + 1)
+    return lower, now + timedelta(days=start_days + 1)
+
+
+FILETIME_EPOCH = datetime(1601, 1, 1, tzinfo=timezone.utc)
+FILETIME_TICKS_PER_DAY = 864_000_000_000
+
+
+def datetime_to_filetime(value: datetime | None) -> int:
+    # Exact integer conversion (100 ns ticks since 1601); None maps to the never-expires sentinel
+    if value is None:
+        return NEVER_EXPIRES
+    return (value - FILETIME_EPOCH) // timedelta(microseconds=1) * 10
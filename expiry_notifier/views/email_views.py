@@ -1,95 +1,47 @@
 import logging
 from datetime import datetime
 from django.contrib import messages
-from django.core.mail import EmailMultiAlternatives
-from django.template.loader import render_to_string
-from django.utils.html import strip_tags
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpResponseNotAllowed, JsonResponse
 from django.views.decorators.http import require_POST
-from django.shortcuts import redirect
+from django.shortcuts import redirect, render
 from ldap_notify import settings
-from ..services.user_service import get_users
-import json
+from ..metrics import EMAILS
+from ..services.config_service import get_notification_config
+from ..services.manual_service import build_manual_email, get_bulk_progress, resolve_bulk_recipients, start_bulk_send
+from ..services.user_service import find_user_by_email, get_directory_snapshot
+from ..utils.async_utils import async_login_required, run_blocking
+from .main_views import parse_dashboard_filters
 from django.conf import settings
 
 logger = logging.getLogger(__name__)
 
-CONFIG_PATH = 'config.json'
-with open(CONFIG_PATH) as f:
-    NOTIFICATION_CONFIG = json.load(f)
 
-
-@require_POST
-def send_email_view(request, email):
+def deliver_manual_notification(request, email):
     try:
-        users = get_users()
-        user_data = next((user for user in users if user['email'] == email), None)
+        user_data = find_user_by_email(email)
 
-        if not user_data:
+        if not user_data or user_data.is_admin:
             messages.error(request, "User not found")
             return redirect('main_page')
 
-        try:
-            expiry_date = datetime.fromisoformat(
-                user_data['account_expires_raw'].replace('Z', '+00:00')
-            ).date()
-            today = datetime.now().date()
-            expired_days = (expiry_date - today).days
-        except (ValueError, AttributeError, TypeError) as e:
-            logger.error(f"Date parsing error: {str(e)}")
+        if not user_data.expires_at:
+            logger.error(f"No account expiration for {email}")
             messages.error(request, "Failed to determine account expiration")
             return redirect('main_page')
 
-        context = {
-            'username': user_data.get('username', 'user'),
-            'expired_days': expired_days,
-            'days_overdue': abs(expired_days) if expired_days < 0 else 0,
-            'expiry_date': expiry_date.strftime('%Y-%m-%d'),
-            'current_date': today.strftime('%Y-%m-%d')
-        }
-
-        config = NOTIFICATION_CONFIG['manual_notification_settings']
-
-        if expired_days > config['early']['days']:
-            notification_type = 'early'
-        elif expired_days > config['middle']['days']:
-            notification_type = 'middle'
-        elif expired_days > config['urgent']['days']:
-            notification_type = 'urgent'
-        elif expired_days == config['today']['days']:
-            notification_type = 'today'
-        elif expired_days < 0:
-            notification_type = 'expired'
-
-        notification_config = config[notification_type]
-
-        # Форматируем контент из JSON
-        email_content = notification_config['email_content']
-        formatted_content = {
-            'header': email_content['header'].format(**context),
-            'body': email_content['body'].format(**context),
-            'footer': email_content['footer'].format(**context)
-        }
-
-        context.update({
-            'subject': notification_config['subject'].format(**context),
-            'urgency_level': notification_config['urgency_level'],
-            'message_type': notification_config['message_type'],
-            'email_content': formatted_content
-        })
-
-        html_message = render_to_string('emails/manual_user_notification.html', context)
-        text_message = strip_tags(html_message)
-
-        email_msg = EmailMultiAlternatives(
-            subject=context['subject'],
-            body=text_message,
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            to=[email],
+        email_msg = build_manual_email(
+            user_data.username, email, user_data.expires_at.date(),
+            get_notification_config().templates, datetime.now().date(),
         )
-        email_msg.attach_alternative(html_message, "text/html")
-        email_msg.send(fail_silently=False)
+        try:
+            email_msg.send(fail_silently=False)
+        except Exception:
+            EMAILS.labels('manual', 'failed').inc()
+            raise
+        EMAILS.labels('manual', 'sent').inc()
 
-        messages.success(request, f"Notification sent: {context['subject']}")
+        messages.success(request, f"Notification sent: {email_msg.subject}")
         logger.info(f"Email sent to {email}")
 
     except Exception as e:
@@ -97,3 +49,83 @@ def send_email_view(request, email):
         logger.error(f"Email sending error: {str(e)}", exc_info=True)
 
     return redirect('main_page')
+
+
+@login_required
+@require_POST
+def send_email_view(request, email):
+    return deliver_manual_notification(request, email)
+
+
+@async_login_required
+async def send_email_view_async(request, email):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    return await run_blocking(deliver_manual_notification, request, email)
+
+
+def queue_bulk_notification(request):
+    try:
+        snapshot = get_directory_snapshot()
+        if request.POST.get('scope') == 'selected':
+            recipients = resolve_bulk_recipients(snapshot, emails=request.POST.getlist('emails'))
+        else:
+            filters = parse_dashboard_filters(request.POST)
+            recipients = resolve_bulk_recipients(
+                snapshot,
+                status=filters['filter'],
+                expires_window=filters['expires_window'],
+                search=filters['search'],
+            )
+
+        if not recipients:
+            messages.error(request, "No users to notify")
+            return redirect('main_page')
+
+        limit = getattr(settings, 'BULK_SEND_MAX_RECIPIENTS', 1000)
+        if limit and len(recipients) > limit:
+            messages.error(request, f"Too many recipients: {len(recipients)} (limit {limit})")
+            return redirect('main_page')
+
+        progress = start_bulk_send(recipients, requested_by=request.user.get_username())
+    except Exception as e:
+        messages.error(request, f"Sending error: {str(e)}")
+        logger.error(f"Bulk send error: {str(e)}", exc_info=True)
+        return redirect('main_page')
+
+    messages.success(request, f"{progress['total']} notification(s) queued")
+    return redirect('bulk_send_progress', batch_id=progress['id'])
+
+
+def render_bulk_progress(request, batch_id):
+    progress = get_bulk_progress(batch_id)
+    if progress is None:
+        raise Http404("Unknown or expired batch")
+    if request.GET.get('format') == 'json':
+        return JsonResponse(progress)
+    progress['done'] = progress['sent'] + progress['failed']
+    progress['percent'] = round(100 * progress['done'] / progress['total']) if progress['total'] else 100
+    return render(request, "bulk_send_progress.html", {"progress": progress})
+
+
+@login_required
+@require_POST
+def bulk_send_view(request):
+    return queue_bulk_notification(request)
+
+
+@async_login_required
+async def bulk_send_view_async(request):
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    return await run_blocking(queue_bulk_notification, request)
+
+
+@login_required
+def bulk_progress_view(request, batch_id):
+    return render_bulk_progress(request, batch_id)
+
+
+@async_login_required
+async def bulk_progress_view_async(request, batch_id):
+    return await run_blocking(render_bulk_progress, request, batch_id)
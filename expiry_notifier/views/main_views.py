@@ -1,20 +1,75 @@
+from datetime import datetime, timezone
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.core.paginator import Paginator
 from django.shortcuts import render
-from expiry_notifier.services.user_service import get_users
-from ..utils.time_util import format_iso_time
+from expiry_notifier.services.config_service import get_notification_config
+from expiry_notifier.services.user_service import SORT_OPTIONS, STATUS_FILTERS, get_directory_snapshot, query_users
+from ..utils.async_utils import async_login_required, run_blocking
+from ..utils.time_util import days_left_window
+
+
+def parse_dashboard_filters(params) -> dict:
+    stage_windows = get_notification_config().stage_windows
+    filter_param = params.get('filter', 'all')
+    if filter_param not in STATUS_FILTERS:
+        filter_param = 'all'
+    stage = params.get('stage', '')
+    if stage not in stage_windows:
+        stage = ''
+    sort = params.get('sort', '')
+    if sort not in SORT_OPTIONS:
+        sort = ''
+    search = params.get('q', '').strip()
+
+    expires_window = None
+    if stage:
+        expires_window = days_left_window(*stage_windows[stage], datetime.now(timezone.utc))
+
+    return {
+        'stages': list(stage_windows),
+        'filter': filter_param,
+        'stage': stage,
+        'sort': sort,
+        'search': search,
+        'expires_window': expires_window,
+    }
+
+
+def render_main_page(request):
+    filters = parse_dashboard_filters(request.GET)
+    users = query_users(
+        get_directory_snapshot(),
+        status=filters['filter'],
+        expires_window=filters['expires_window'],
+        search=filters['search'],
+        sort=filters['sort'],
+    )
+
+    paginator = Paginator(users, getattr(settings, 'DASHBOARD_PAGE_SIZE', 50))
+    page = paginator.get_page(request.GET.get('page'))
+
+    query = request.GET.copy()
+    query.pop('page', None)
+
+    return render(request, "main_page.html", {
+        "users": page,
+        "page_range": paginator.get_elided_page_range(page.number),
+        "total_users": paginator.count,
+        "filter": filters['filter'],
+        "stage": filters['stage'],
+        "stages": filters['stages'],
+        "sort": filters['sort'],
+        "search": filters['search'],
+        "query_string": query.urlencode(),
+    })
 
 
 @login_required
 def main_page(request):
-    filter_param = request.GET.get('filter', 'all')
-    users = get_users()
-    for user in users:
-        user['account_expires_raw'] = format_iso_time(user['account_expires_raw'])
+    return render_main_page(request)
 
-    if filter_param == 'expired':
-        users = [u for u in users if u.get('expired')]
 
-    return render(request, "main_page.html", {
-        "users": users,
-        "filter": filter_param
-    })
\ No newline at end of file
+@async_login_required
+async def main_page_async(request):
+    return await run_blocking(render_main_page, request)
@@ -0,0 +1,7 @@
+from django.http import HttpResponse
+from expiry_notifier.metrics import render_metrics
+
+
+def metrics_view(request):
+    payload, content_type = render_metrics()
+    return HttpResponse(payload, content_type=content_type)
@@ -0,0 +1,18 @@
+"""
+ASGI config for ldap_notify project.
+
+It exposes the ASGI callable as a module-level variable named ``application``.
+Serving through it switches the dashboard and manual-send views to their
+async variants (see SERVE_ASYNC in settings).
+
+For more information on this file, see
+https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
+"""
+
+import os
+from django.core.asgi import get_asgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'ldap_notify.settings')
+os.environ.setdefault('SERVE_ASYNC', '1')
+
+application = get_asgi_application()
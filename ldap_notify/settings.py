@@ -16,7 +16,11 @@ SECRET_KEY = os.getenv("SECRET_KEY")
 #Настройки LDAP-сервера
 LDAP_SERVER = os.getenv('LDAP_SERVER')  # URI LDAP-сервера (например, ldaps://ldap.example.com)
 LDAP_PORT = int(os.getenv('LDAP_PORT'))  # Порт подключения (обычно 636 или 389)
-AUTH_LDAP_SERVER_URI = f"{LDAP_SERVER}:{LDAP_PORT}"  # Полный URI с портом
+LDAP_SERVERS = [uri.strip() for uri in os.getenv('LDAP_SERVERS', '').split(',') if uri.strip()] or [LDAP_SERVER]  # Контроллеры домена через запятую (по умолчанию только LDAP_SERVER)
+LDAP_POOL_STRATEGY = os.getenv('LDAP_POOL_STRATEGY', 'ROUND_ROBIN')  # Распределение чтения между контроллерами: ROUND_ROBIN, FIRST, RANDOM
+LDAP_FAILOVER_TIMEOUT = int(os.getenv('LDAP_FAILOVER_TIMEOUT', 3))  # Таймаут подключения (сек) к одному контроллеру, если их несколько
+LDAP_SERVER_EXHAUST = int(os.getenv('LDAP_SERVER_EXHAUST', 60))  # Сколько секунд не обращаться к недоступному контроллеру
+AUTH_LDAP_SERVER_URI = " ".join(f"{uri}:{LDAP_PORT}" for uri in LDAP_SERVERS)  # Полные URI с портом (python-ldap перебирает их по очереди)
 AUTH_LDAP_BIND_DN = os.getenv('AUTH_LDAP_BIND_DN')  # DN для подключения к LDAP (например, EXAMPLE\\admin)
 AUTH_LDAP_BIND_PASSWORD = os.getenv('AUTH_LDAP_BIND_PASSWORD')  # Пароль от LDAP
 AUTH_LDAP_BASE_DN = os.getenv('AUTH_LDAP_BASE_DN')  # Базовый DN, откуда начинается поиск
@@ -25,6 +29,17 @@ AUTH_LDAP_ALWAYS_UPDATE_USER = bool(os.getenv('AUTH_LDAP_ALWAYS_UPDATE_USER'))
 AUTH_LDAP_FIND_GROUP_PERMS = bool(os.getenv('AUTH_LDAP_FIND_GROUP_PERMS'))  # Использовать группы LDAP для прав
 AUTH_LDAP_GROUP_TYPE = os.getenv('AUTH_LDAP_GROUP_TYPE')  # Тип групп (если указан)
 AUTH_LDAP_START_TLS = False  # Отключено TLS (используется LDAPS напрямую)
+LDAP_ADMIN_GROUP_DN = os.getenv('LDAP_ADMIN_GROUP_DN', f"CN=Domain Admins,CN=Users,{AUTH_LDAP_BASE_DN}")  # Группа администраторов (получатели отчёта)
+LDAP_PAGE_SIZE = int(os.getenv('LDAP_PAGE_SIZE', 500))  # Размер страницы постраничного поиска (не больше MaxPageSize в AD)
+LDAP_USER_GROUP_DN = os.getenv('LDAP_USER_GROUP_DN', '')  # Работать только с членами этой группы (пусто — со всеми пользователями)
+LDAP_NESTED_GROUPS = bool(os.getenv('LDAP_NESTED_GROUPS', '0') == '1')  # Учитывать вложенные группы в LDAP_USER_GROUP_DN (дороже для контроллера домена)
+LDAP_SERVER_GET_INFO = os.getenv('LDAP_SERVER_GET_INFO', 'SCHEMA')  # Чтение схемы/DSA при первом bind в процессе: NONE, SCHEMA, DSA, ALL
+
+#Пул LDAP-соединений (на процесс)
+LDAP_POOL_SIZE = int(os.getenv('LDAP_POOL_SIZE', 4))  # Максимум соединений в пуле
+LDAP_POOL_MAX_IDLE = int(os.getenv('LDAP_POOL_MAX_IDLE', 300))  # Через сколько секунд простоя соединение закрывается
+LDAP_POOL_HEALTHCHECK_INTERVAL = int(os.getenv('LDAP_POOL_HEALTHCHECK_INTERVAL', 60))  # Проверка (whoami) соединения, простоявшего дольше N секунд
+LDAP_WRITE_CONCURRENCY = int(os.getenv('LDAP_WRITE_CONCURRENCY', 16))  # Сколько запросов modify может одновременно ожидать ответа
 
 #Временная зона и поддержка времени
 TIME_ZONE = 'Europe/Moscow'
@@ -174,7 +189,8 @@ WSGI_APPLICATION = 'ldap_notify.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',  # SQLite как база
-        'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),  # Файл базы данных
+        'NAME': os.getenv('DATABASE_PATH', os.path.join(BASE_DIR, 'db.sqlite3')),  # Файл базы данных (общий для web и Celery)
+        'OPTIONS': {'timeout': 20},  # Сколько секунд ждать блокировку файла, пока пишет другой контейнер
     }
 }
 
@@ -204,6 +220,54 @@ EMAIL_USE_TLS = bool(os.getenv('EMAIL_USE_TLS'))  # TLS включён?
 EMAIL_HOST_USER = os.getenv('EMAIL_HOST_USER')  # Логин SMTP
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')  # Пароль SMTP
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER  # Отправитель по умолчанию
+EMAIL_BATCH_SIZE = int(os.getenv('EMAIL_BATCH_SIZE', 100))  # Писем за одну SMTP-сессию
+EMAIL_DISPATCH_CONCURRENCY = int(os.getenv('EMAIL_DISPATCH_CONCURRENCY', 4))  # На сколько параллельных задач Celery делится рассылка
+EMAIL_MAX_PER_SECOND = float(os.getenv('EMAIL_MAX_PER_SECOND', 5))  # Общий лимит писем в секунду (0 — без ограничения)
+
+#Кэш Django (Redis, если задан CACHE_REDIS_URL, иначе память процесса)
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_REDIS_URL,
+    } if CACHE_REDIS_URL else {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+DIRECTORY_CACHE_TTL = int(os.getenv('DIRECTORY_CACHE_TTL', 300))  # Сколько секунд снимок каталога считается свежим
+DIRECTORY_CACHE_STALE_TTL = int(os.getenv('DIRECTORY_CACHE_STALE_TTL', 900))  # Сколько секунд после TTL отдаётся устаревший снимок, пока идёт фоновое обновление
+
+#Источник данных каталога: 'ldap' — прямой поиск, 'mirror' — локальная копия в БД с инкрементальной синхронизацией
+DIRECTORY_SOURCE = os.getenv('DIRECTORY_SOURCE', 'ldap')
+DIRECTORY_SYNC_INTERVAL = int(os.getenv('DIRECTORY_SYNC_INTERVAL', 300))  # Период (сек) инкрементальной синхронизации по uSNChanged
+DIRECTORY_FULL_SYNC_INTERVAL = int(os.getenv('DIRECTORY_FULL_SYNC_INTERVAL', 24 * 60 * 60))  # Период (сек) полной сверки с каталогом
+
+#Конфигурация уведомлений: путь к config.json (в отдельном каталоге, чтобы его можно было смонтировать целиком) и как часто (сек) проверять его mtime для перечитывания без перезапуска
+NOTIFICATION_CONFIG_PATH = os.getenv('NOTIFICATION_CONFIG_PATH', str(BASE_DIR / 'config' / 'config.json'))
+NOTIFICATION_CONFIG_CHECK_INTERVAL = int(os.getenv('NOTIFICATION_CONFIG_CHECK_INTERVAL', 5))
+
+#Сколько дней после истечения учётная запись ещё попадает в ежедневную рассылку (0 — без ограничения)
+NOTIFICATION_EXPIRED_LOOKBACK_DAYS = int(os.getenv('NOTIFICATION_EXPIRED_LOOKBACK_DAYS', 1))
+
+#Где хранить, какие уведомления уже отправлены: ldap — метки notified_<стадия> в атрибуте info, database — таблица NotificationLedger (без записи в AD)
+NOTIFICATION_STATE_BACKEND = os.getenv('NOTIFICATION_STATE_BACKEND', 'ldap')
+
+#Через сколько секунд без продвижения незавершённая рассылка считается прерванной и дорабатывается следующим запуском
+NOTIFICATION_RUN_STALE_AFTER = int(os.getenv('NOTIFICATION_RUN_STALE_AFTER', 3600))
+NOTIFICATION_RUN_RETENTION_DAYS = int(os.getenv('NOTIFICATION_RUN_RETENTION_DAYS', 30))  # Сколько дней хранить журнал завершённых рассылок
+
+#Prometheus: адрес Pushgateway, куда Celery-воркеры отправляют метрики после каждой задачи (пусто — не отправлять)
+PROMETHEUS_PUSHGATEWAY_URL = os.getenv('PROMETHEUS_PUSHGATEWAY_URL', '')
+
+#Асинхронный режим (ASGI): включается автоматически в ldap_notify/asgi.py; блокирующие вызовы LDAP/SMTP выполняются в пуле из ASYNC_BLOCKING_WORKERS потоков
+SERVE_ASYNC = bool(os.getenv('SERVE_ASYNC', '0') == '1')
+ASYNC_BLOCKING_WORKERS = int(os.getenv('ASYNC_BLOCKING_WORKERS', 8))
+
+#Массовая ручная рассылка: максимум получателей в одной пачке (0 — без ограничения)
+BULK_SEND_MAX_RECIPIENTS = int(os.getenv('BULK_SEND_MAX_RECIPIENTS', 1000))
+
+#Количество пользователей на странице панели управления
+DASHBOARD_PAGE_SIZE = int(os.getenv('DASHBOARD_PAGE_SIZE', 50))
 
 #Редиректы после входа
 LOGIN_REDIRECT_URL = '/'
@@ -233,3 +297,9 @@ CELERY_BEAT_SCHEDULE = {
         'schedule': crontab(hour=11, minute=30),  # Каждый день в 11:30
     },
 }
+
+if DIRECTORY_SOURCE == 'mirror':
+    CELERY_BEAT_SCHEDULE['sync-directory-mirror'] = {
+        'task': 'expiry_notifier.tasks.sync_directory_mirror',
+        'schedule': DIRECTORY_SYNC_INTERVAL,
+    }